@@ -0,0 +1,56 @@
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from synth_invo_analyzer.cache import LRUCache
+
+# Outbound mail. send_emails_task (authentication.tasks) is dispatched with
+# a list of message specs and sends them over mail_connection(), one SMTP
+# connection per worker process reused by every task that process runs.
+# Sending goes through EMAIL_BACKEND, so the locmem backend captures it.
+
+_templates = LRUCache(maxsize=64)
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def render_template(template_name, context):
+    template = _templates.get(template_name)
+    if template is None:
+        template = get_template(template_name)
+        _templates.set(template_name, template)
+    return template.render(context)
+
+
+def email_spec(recipient, subject, template_name, context):
+    return {'recipient': recipient, 'subject': subject, 'template_name': template_name, 'context': context}
+
+
+def build_message(spec):
+    message = EmailMessage(
+        spec['subject'],
+        render_template(spec['template_name'], spec['context']),
+        settings.EMAIL_HOST_USER,
+        [spec['recipient']],
+    )
+    message.content_subtype = 'html'
+    return message
+
+
+@contextmanager
+def mail_connection():
+    # Opened on first use and kept open for later tasks; closed and dropped
+    # when the block raises, so the next use reconnects.
+    global _connection
+    with _connection_lock:
+        try:
+            if _connection is None:
+                _connection = get_connection()
+            _connection.open()
+            yield _connection
+        except Exception:
+            if _connection is not None:
+                _connection.close()
+                _connection = None
+            raise
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.9 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_drain_otp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OneTimePassword',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('otp', models.CharField(max_length=6)),
+                ('expires_at', models.DateTimeField()),
+                ('removed_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -64,18 +64,6 @@ class SystemAdmin(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
-class OTP(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.EmailField()
-    otp = models.CharField(max_length=6)
-    created_at = models.DateTimeField(auto_now_add=True)
-    verified = models.BooleanField(default=False)
-
-    def is_valid(self):
-        current_time = timezone.now()
-        time_difference = (current_time - self.created_at).seconds
-        return time_difference < 60
-
 class SupplierRequest(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     STATUS_CHOICES = [
@@ -94,3 +82,12 @@ class SupplierRequest(models.Model):
 
     class Meta:
         unique_together = ('organization', 'email')
+
+
+class OneTimePassword(models.Model):
+    # One active code per email, kept by otp_store.DatabaseOTPStore.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    email = models.EmailField(unique=True)
+    otp = models.CharField(max_length=6)
+    expires_at = models.DateTimeField()
+    removed_at = models.DateTimeField(db_index=True)
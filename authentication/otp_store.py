@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from synth_invo_analyzer.cache import is_shared_cache
+from .models import OneTimePassword
+
+# One active code per email. put() replaces any earlier code for the email
+# in one write; a code stops verifying OTP_TTL seconds after it was issued,
+# and the entry itself is gone OTP_RETENTION seconds later. The store class
+# is chosen by the OTP_STORE setting; unset, it is CacheOTPStore when the
+# default cache is shared by all workers and DatabaseOTPStore otherwise.
+
+
+def _ttl():
+    return getattr(settings, 'OTP_TTL', 60)
+
+
+def _timeout():
+    return _ttl() + getattr(settings, 'OTP_RETENTION', 300)
+
+
+def _check(entry, otp):
+    if entry is None:
+        return False, "No OTP found for this email"
+    if entry['expires_at'] <= time.time():
+        return False, "OTP has expired"
+    if not hmac.compare_digest(entry['otp'], str(otp)):
+        return False, "Wrong OTP"
+    return True, "Verified"
+
+
+class CacheOTPStore:
+    # Entries live in the shared cache, which expires them.
+
+    def key(self, email):
+        return 'otp:' + hashlib.sha256(email.encode('utf-8')).hexdigest()
+
+    def put(self, email, otp, issued_at=None):
+        issued_at = issued_at or time.time()
+        cache.set(self.key(email), {'otp': otp, 'expires_at': issued_at + _ttl()}, _timeout())
+
+    def verify(self, email, otp):
+        # A matching code is consumed; only the request whose delete
+        # succeeds is verified, so a code cannot be used twice.
+        verified, message = _check(cache.get(self.key(email)), otp)
+        if verified and not cache.delete(self.key(email)):
+            return False, "No OTP found for this email"
+        return verified, message
+
+    def discard(self, email):
+        cache.delete(self.key(email))
+
+
+def _datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class DatabaseOTPStore:
+    # One OneTimePassword row per email in the default database, for setups
+    # without a shared cache. Removed rows are swept on put().
+
+    def put(self, email, otp, issued_at=None):
+        issued_at = issued_at or time.time()
+        OneTimePassword.objects.update_or_create(
+            email=email,
+            defaults={'otp': otp, 'expires_at': _datetime(issued_at + _ttl()), 'removed_at': _datetime(issued_at + _timeout())},
+        )
+        OneTimePassword.objects.filter(removed_at__lte=_datetime(time.time())).delete()
+
+    def verify(self, email, otp):
+        row = OneTimePassword.objects.filter(email=email, removed_at__gt=_datetime(time.time())).first()
+        entry = {'otp': row.otp, 'expires_at': row.expires_at.timestamp()} if row else None
+        verified, message = _check(entry, otp)
+        # As in CacheOTPStore, only the request whose delete matched the code
+        # is verified.
+        if verified and not OneTimePassword.objects.filter(pk=row.pk, otp=row.otp).delete()[0]:
+            return False, "No OTP found for this email"
+        return verified, message
+
+    def discard(self, email):
+        OneTimePassword.objects.filter(email=email).delete()
+
+
+class InMemoryOTPStore:
+    # Per-process store for tests and single-process deployments.
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.time()
+
+    def put(self, email, otp, issued_at=None):
+        issued_at = issued_at or time.time()
+        with self._lock:
+            self._entries[email] = {'otp': otp, 'expires_at': issued_at + _ttl(), 'removed_at': issued_at + _timeout()}
+            # Removed entries are swept at most once per OTP_TTL.
+            now = time.time()
+            if now - self._swept_at >= _ttl():
+                for key in [key for key, entry in self._entries.items() if entry['removed_at'] <= now]:
+                    del self._entries[key]
+                self._swept_at = now
+
+    def verify(self, email, otp):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry['removed_at'] <= time.time():
+                entry = None
+            verified, message = _check(entry, otp)
+            if verified:
+                del self._entries[email]
+            return verified, message
+
+    def discard(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+
+_store = None
+
+
+def otp_store():
+    global _store
+    if _store is None:
+        store_class = getattr(settings, 'OTP_STORE', None)
+        if not store_class:
+            store_class = 'authentication.otp_store.' + ('CacheOTPStore' if is_shared_cache() else 'DatabaseOTPStore')
+        _store = import_string(store_class)()
+    return _store
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from .models import Supplier, Organization
+
+
+def supplier_cache_key(supplier_id):
+    return f'party:supplier:{supplier_id}'
+
+
+def organization_cache_key(organization_id):
+    return f'party:organization:{organization_id}'
+
+
+def _load_suppliers(supplier_ids):
+    suppliers = Supplier.objects.filter(id__in=supplier_ids).select_related('user')
+    return {str(supplier.id): {'name': supplier.user.username, 'logo_url': supplier.logo_url} for supplier in suppliers}
+
+
+def _load_organizations(organization_ids):
+    organizations = Organization.objects.filter(id__in=organization_ids)
+    return {str(organization.id): {'name': organization.name, 'logo_url': organization.logo_url} for organization in organizations}
+
+
+class PartyDirectory:
+    # Names and logos of suppliers and organizations for one serialization
+    # pass. prime() resolves a whole page at once: shared cache first, then
+    # one query per party type for the misses. Unknown ids resolve to {}.
+    # cached=False reads the database only; snapshot writers use it, since
+    # a cached copy can still hold a name from before a rename.
+
+    def __init__(self, cached=True):
+        self.cached = cached
+        self.suppliers = {}
+        self.organizations = {}
+
+    def _resolve(self, resolved, ids, cache_key, load):
+        missing = {str(party_id) for party_id in ids if party_id is not None} - resolved.keys()
+        if not missing:
+            return
+        if not self.cached:
+            loaded = load(missing)
+            resolved.update({party_id: loaded.get(party_id, {}) for party_id in missing})
+            return
+        keys = {cache_key(party_id): party_id for party_id in missing}
+        for key, entry in cache.get_many(list(keys)).items():
+            resolved[keys[key]] = entry
+            missing.discard(keys[key])
+        if missing:
+            loaded = load(missing)
+            entries = {party_id: loaded.get(party_id, {}) for party_id in missing}
+            cache.set_many(
+                {cache_key(party_id): entry for party_id, entry in entries.items()},
+                getattr(settings, 'PARTY_DIRECTORY_CACHE_TTL', 300),
+            )
+            resolved.update(entries)
+
+    def prime(self, supplier_ids=(), organization_ids=()):
+        self._resolve(self.suppliers, supplier_ids, supplier_cache_key, _load_suppliers)
+        self._resolve(self.organizations, organization_ids, organization_cache_key, _load_organizations)
+
+    def supplier(self, supplier_id):
+        self.prime(supplier_ids=[supplier_id])
+        return self.suppliers.get(str(supplier_id), {})
+
+    def organization(self, organization_id):
+        self.prime(organization_ids=[organization_id])
+        return self.organizations.get(str(organization_id), {})
+
+    def snapshot(self, supplier_id, organization_id):
+        # Values for an invoice's party snapshot columns.
+        supplier = self.supplier(supplier_id)
+        return {
+            'issuer_name': supplier.get('name'),
+            'supplier_logo_url': supplier.get('logo_url'),
+            'recipient_name': self.organization(organization_id).get('name'),
+        }
+
+
+def party_directory(context):
+    # One directory per serializer context, shared by a list and its items.
+    return context.setdefault('party_directory', PartyDirectory())
+
+
+def invalidate_supplier(supplier_id):
+    cache.delete(supplier_cache_key(supplier_id))
+
+
+def invalidate_organization(organization_id):
+    cache.delete(organization_cache_key(organization_id))
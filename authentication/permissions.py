@@ -1,103 +1,49 @@
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied
-from .models import Organization, Supplier, SystemAdmin
-from .utils import decode_token
-from subscriptions.models import Subscription
+from subscriptions.entitlements import get_entitlement
+from .principal import request_principal
+
+# The caller is resolved once per request by PrincipalAuthentication; these
+# classes only inspect request.user. The role checks return False rather than
+# raise, so compositions such as IsOrganization | IsSupplier try each side.
 
 class IsOrganization(permissions.BasePermission):
+    message = "You do not have permission to access this resource as an organization"
+
     def has_permission(self, request, view):
-        token = request.headers.get('Authorization')
-        if not token:
-            raise PermissionDenied("Token is missing")
-        user_info = decode_token(token)
-        if 'user_id' not in user_info or 'role' not in user_info:
-            raise PermissionDenied("Invalid token")
-        user_id = user_info['user_id']
-        role = user_info['role']
-        if role == 'organization':
-            if Organization.objects.filter(user_id=user_id).exists():
-                return True
-        raise PermissionDenied("You do not have permission to access this resource as an organization")
+        return request_principal(request).has_role('organization')
 
 class IsSupplier(permissions.BasePermission):
+    message = "You do not have permission to access this resource as a supplier"
+
     def has_permission(self, request, view):
-        token = request.headers.get('Authorization')
-        if not token:
-            raise PermissionDenied("Token is missing")
-        user_info = decode_token(token)
-        if 'user_id' not in user_info or 'role' not in user_info:
-            raise PermissionDenied("Invalid token")
-        user_id = user_info['user_id']
-        role = user_info['role']
-        if role == 'supplier':
-            if Supplier.objects.filter(user_id=user_id).exists():
-                return True
-        raise PermissionDenied("You do not have permission to access this resource as a supplier")
+        return request_principal(request).has_role('supplier')
 
 class IsSystemAdmin(permissions.BasePermission):
+    message = "You do not have permission to access this resource as a system admin"
+
     def has_permission(self, request, view):
-        token = request.headers.get('Authorization')
-        if not token:
-            raise PermissionDenied("Token is missing")
-        user_info = decode_token(token)
-        if 'user_id' not in user_info or 'role' not in user_info:
-            raise PermissionDenied("Invalid token")
-        user_id = user_info['user_id']
-        role = user_info['role']
-        if role == 'system_admin':
-            if SystemAdmin.objects.filter(id=user_id).exists():
-                return True
-        raise PermissionDenied("You do not have permission to access this resource as a system admin")
+        return request_principal(request).has_role('system_admin')
+
+
 
 
+def has_plan(request, plan):
+    principal = request_principal(request)
+    if principal.role == 'organization':
+        entitlement = get_entitlement(principal.entity_id) if principal.entity_id else {'plan': None}
+        if entitlement['plan'] is None:
+            raise PermissionDenied("No subscription found for this organization")
+        if entitlement['plan'] == plan:
+            return True
+        raise PermissionDenied(f"You do not have permission to access this resource with {plan} subscription")
+    raise PermissionDenied(f"You do not have permission to access this resource as an organization with {plan} subscription")
 
 
 class IsStandard(permissions.BasePermission):
     def has_permission(self, request, view):
-        token = request.headers.get('Authorization')
-        if not token:
-            raise PermissionDenied("Token is missing")
-        
-        user_info = decode_token(token)
-        if 'user_id' not in user_info or 'role' not in user_info:
-            raise PermissionDenied("Invalid token")
-        
-        user_id = user_info['user_id']
-        role = user_info['role']
-        
-        if role == 'organization':
-            try:
-                subscription = Subscription.objects.get(organization__user_id=user_id)
-                if subscription.subscription_model.model_name == 'Standard':
-                    return True
-                else:
-                    raise PermissionDenied("You do not have permission to access this resource with Standard subscription")
-            except Subscription.DoesNotExist:
-                raise PermissionDenied("No subscription found for this organization")
-        
-        raise PermissionDenied("You do not have permission to access this resource as an organization with Standard subscription")
+        return has_plan(request, 'Standard')
 
 class IsPremium(permissions.BasePermission):
     def has_permission(self, request, view):
-        token = request.headers.get('Authorization')
-        if not token:
-            raise PermissionDenied("Token is missing")
-        
-        user_info = decode_token(token)
-        if 'user_id' not in user_info or 'role' not in user_info:
-            raise PermissionDenied("Invalid token")
-        
-        user_id = user_info['user_id']
-        role = user_info['role']
-        
-        if role == 'organization':
-            try:
-                subscription = Subscription.objects.get(organization__user_id=user_id)
-                if subscription.subscription_model.model_name == 'Premium':
-                    return True
-                else:
-                    raise PermissionDenied("You do not have permission to access this resource with Premium subscription")
-            except Subscription.DoesNotExist:
-                raise PermissionDenied("No subscription found for this organization")
-        
-        raise PermissionDenied("You do not have permission to access this resource as an organization with Premium subscription")
\ No newline at end of file
+        return has_plan(request, 'Premium')
@@ -0,0 +1,85 @@
+import hashlib
+import time
+from django.conf import settings
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import PermissionDenied
+from synth_invo_analyzer.cache import LRUCache
+from .models import Organization, Supplier, SystemAdmin
+from .utils import decode_token
+
+# sha256 of the bearer token -> Principal. Entries live at most
+# AUTH_PRINCIPAL_CACHE_TTL seconds, so a removed role entity is picked up
+# within that window.
+_principal_cache = LRUCache(
+    maxsize=getattr(settings, 'AUTH_PRINCIPAL_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_PRINCIPAL_CACHE_TTL', 60),
+)
+
+
+class Principal:
+    # The caller behind a bearer token. entity_id is the Organization,
+    # Supplier or SystemAdmin row of the token's role, None when it does not
+    # exist.
+    __slots__ = ('user_id', 'role', 'entity_id', 'expires_at')
+
+    is_authenticated = True
+
+    def __init__(self, user_id, role, entity_id=None, expires_at=None):
+        self.user_id = user_id
+        self.role = role
+        self.entity_id = entity_id
+        self.expires_at = expires_at
+
+    def has_role(self, role):
+        return self.role == role and self.entity_id is not None
+
+
+def resolve_principal(payload):
+    user_id, role = payload['user_id'], payload['role']
+    entity_id = None
+    if role == 'organization':
+        entity_id = Organization.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    elif role == 'supplier':
+        entity_id = Supplier.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    elif role == 'system_admin':
+        entity_id = SystemAdmin.objects.filter(id=user_id).values_list('id', flat=True).first()
+    return Principal(user_id, role, entity_id, payload.get('exp'))
+
+
+class PrincipalAuthentication(BaseAuthentication):
+    # Decodes the bearer token once per request and sets request.user to its
+    # Principal. Requests without a usable token stay anonymous; the error is
+    # kept on request.token_error for the permission classes to raise.
+
+    def authenticate(self, request):
+        token = request.headers.get('Authorization')
+        if not token:
+            return None
+        try:
+            return get_principal_for_token(token), token
+        except PermissionDenied as e:
+            request.token_error = e
+            return None
+
+
+def get_principal_for_token(token):
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    principal = _principal_cache.get(key)
+    if principal is None:
+        payload = decode_token(token)
+        if 'user_id' not in payload or 'role' not in payload:
+            raise PermissionDenied("Invalid token")
+        principal = resolve_principal(payload)
+        _principal_cache.set(key, principal)
+    elif principal.expires_at is not None and principal.expires_at <= time.time():
+        _principal_cache.pop(key)
+        raise PermissionDenied("Token has expired")
+    return principal
+
+
+def request_principal(request):
+    principal = request.user
+    if isinstance(principal, Principal):
+        return principal
+    error = getattr(request, 'token_error', None)
+    raise error or PermissionDenied("Token is missing")
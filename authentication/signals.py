@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User, Supplier, Organization
+from .party_directory import invalidate_supplier, invalidate_organization
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def supplier_changed(sender, instance, **kwargs):
+    invalidate_supplier(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    invalidate_organization(instance.id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Supplier names are usernames. Saves that name their fields and leave
+    # username out (such as the last_login update on login) are ignored.
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    for supplier_id in Supplier.objects.filter(user_id=instance.id).values_list('id', flat=True):
+        invalidate_supplier(supplier_id)
@@ -0,0 +1,23 @@
+from celery import shared_task
+from django.conf import settings
+from .mailer import build_message, mail_connection
+
+
+@shared_task(bind=True, acks_late=True)
+def send_emails_task(self, specs):
+    # Messages already sent are not retried; the rest are, up to
+    # EMAIL_MAX_RETRIES times with exponential backoff.
+    sent = 0
+    try:
+        with mail_connection() as connection:
+            for spec in specs:
+                connection.send_messages([build_message(spec)])
+                sent += 1
+    except Exception as e:
+        print(f"Failed to send {len(specs) - sent} emails: {e}")
+        raise self.retry(
+            args=(specs[sent:],),
+            exc=e,
+            countdown=getattr(settings, 'EMAIL_RETRY_DELAY', 2) * 2 ** self.request.retries,
+            max_retries=getattr(settings, 'EMAIL_MAX_RETRIES', 5),
+        )
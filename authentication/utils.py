@@ -5,14 +5,12 @@ import random, string
 from dotenv import load_dotenv
 from rest_framework.exceptions import PermissionDenied
 import json
-from .models import OTP
+from .otp_store import otp_store
 import pyotp
-from django.core.mail import EmailMessage, get_connection
-from django.conf import settings
-from django.utils import timezone
-from django.template.loader import render_to_string
-from subscriptions.models import Subscription
-from .models import Organization
+from .mailer import email_spec
+from .tasks import send_emails_task
+from synth_invo_analyzer.celery import dispatch
+from subscriptions.entitlements import get_entitlement, is_paid
 
 
 
@@ -31,12 +29,10 @@ def generate_token(user, role, organization_id=None):
     model_name = 'none'
     subscription_status = 'inactive'
     if role == 'organization' and organization_id:
-        organization = Organization.objects.filter(id=organization_id).first()
-        if organization:
-            subscription = Subscription.objects.filter(organization=organization).first()
-            if subscription:
-                model_name = subscription.subscription_model.model_name
-                subscription_status = 'active' if subscription.is_current_period_paid() else 'inactive'
+        entitlement = get_entitlement(organization_id)
+        if entitlement['plan']:
+            model_name = entitlement['plan']
+            subscription_status = 'active' if is_paid(entitlement) else 'inactive'
 
     payload = {
         'rand': random_value,
@@ -92,22 +88,11 @@ def generate_refresh_token(access_token):
 
 
 def send_email(clientMail, subject, template_name, context):
+    # Sent in the background by send_emails_task; False when it could not
+    # be queued.
     try:
-        with get_connection(
-                host=settings.EMAIL_HOST, 
-                port=settings.EMAIL_PORT,  
-                username=settings.EMAIL_HOST_USER, 
-                password=settings.EMAIL_HOST_PASSWORD, 
-                use_tls=settings.EMAIL_USE_TLS
-        ) as connection:
-            email_from = settings.EMAIL_HOST_USER
-            recipient_list = [clientMail]
-            html_message = render_to_string(template_name, context)
-            
-            email = EmailMessage(subject, html_message, email_from, recipient_list, connection=connection)
-            email.content_subtype = 'html'  
-            email.send()
-            return True
+        dispatch(send_emails_task, [email_spec(clientMail, subject, template_name, context)])
+        return True
     except Exception as e:
         print(e)
         return False
@@ -115,7 +100,7 @@ def send_email(clientMail, subject, template_name, context):
 def send_otp(user_email):
     otp = pyotp.TOTP(pyotp.random_base32(), interval=60).now()  
     try:
-        OTP.objects.create(user=user_email, otp=otp)
+        otp_store().put(user_email, otp)
         subject = "Your Verification Code for SynthInvoAnalyzer"
         context = {
             'otp': otp,
@@ -130,28 +115,14 @@ def send_otp(user_email):
 
 
 def resend_otp(user_email):
-    try:
-        temp_user = OTP.objects.get(user=user_email)
-        temp_user.delete()
-    except OTP.DoesNotExist:
-        pass
+    # send_otp replaces the previous code.
     return send_otp(user_email)
 
 
 
 def verify_otp(user_email, user_otp):
     try:
-        temp_user = OTP.objects.get(user=user_email)
-        if not temp_user.is_valid():
-            return False, "OTP has expired"
-        if temp_user.otp == user_otp:
-            temp_user.verified = True
-            temp_user.delete()
-            return True, "Verified"
-        else:
-            return False, "Wrong OTP"
-    except OTP.DoesNotExist:
-        return False, "No OTP found for this email"
+        return otp_store().verify(user_email, user_otp)
     except Exception as e:
         print(e)
         return False, "Verification failed"
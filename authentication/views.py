@@ -5,7 +5,7 @@ from django.contrib.auth.models import update_last_login
 from django.contrib.auth import get_user_model
 from .permissions import  IsOrganization, IsSupplier, IsSystemAdmin
 from .utils import generate_token, generate_refresh_token, decode_token, send_email, send_otp, verify_otp , resend_otp, generate_temporary_password
-from .models import  Organization, Supplier, SystemAdmin, SupplierOrganization, OTP, SupplierRequest
+from .models import  Organization, Supplier, SystemAdmin, SupplierOrganization, SupplierRequest
 from .serializers import  SupplierSerializer, SystemAdminSerializer, OrganizationSerializer, SupplierRequestSerializer, SupplierOrganizationSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
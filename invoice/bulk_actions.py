@@ -0,0 +1,104 @@
+from datetime import datetime
+from django.core.cache import cache
+from search.elasticsearch_utils import delete_invoices_index
+from .models import Invoice, InvoiceBySupplier, InvoiceByOrganization, InvoiceFingerprint
+from .listing_utils import LISTING_MODELS
+from .cql_utils import prepare, execute_concurrent_statements
+from .source_storage import delete_source_files
+from .cache_utils import invoice_cache_key, touch_invoice_lists
+
+# Enough of an invoice to address its row in every table.
+KEY_COLUMNS = ('id', 'issuer', 'recipient', 'created_at', 'content_hash', 'source_file')
+
+
+def _where(model):
+    names = list(model._primary_keys)
+    return ' AND '.join(f'{model._columns[name].db_field_name} = ?' for name in names), names
+
+
+def load_invoice_keys(invoice_ids):
+    # One single-partition read per id, run concurrently. Returns
+    # {invoice id: key row, None when missing, or the read exception}.
+    statement = prepare(f'SELECT {", ".join(KEY_COLUMNS)} FROM {Invoice.column_family_name()} WHERE id = ?')
+    results = execute_concurrent_statements([(statement, [invoice_id]) for invoice_id in invoice_ids])
+    return {
+        invoice_id: (rows.one() if success else rows)
+        for invoice_id, (success, rows) in zip(invoice_ids, results)
+    }
+
+
+def find_invoice_keys(user_id, counterparty=None, date_from=None, date_to=None):
+    # Key rows of the user's invoices from its listing partition(s), with
+    # created_at in [date_from, date_to) and the other party equal to
+    # counterparty when given.
+    keys = {}
+    for model, owner, other in ((InvoiceBySupplier, 'issuer', 'recipient'), (InvoiceByOrganization, 'recipient', 'issuer')):
+        query = model.objects.filter(**{owner: user_id})
+        if date_from:
+            query = query.filter(created_at__gte=date_from)
+        if date_to:
+            query = query.filter(created_at__lt=date_to)
+        if counterparty:
+            query = query.filter(**{other: counterparty}).allow_filtering()
+        for row in query.only(list(KEY_COLUMNS)):
+            keys[row.id] = {name: getattr(row, name) for name in KEY_COLUMNS}
+    return keys
+
+
+def update_statements(row, values):
+    # UPDATEs setting `values` on the invoice and both listing rows.
+    assignments = ', '.join(f'{Invoice._columns[name].db_field_name} = ?' for name in values)
+    for model in (Invoice,) + LISTING_MODELS:
+        where, names = _where(model)
+        statement = prepare(f'UPDATE {model.column_family_name()} SET {assignments} WHERE {where}')
+        yield statement, list(values.values()) + [row[name] for name in names]
+
+
+def _delete_statements(row):
+    for model in (Invoice,) + LISTING_MODELS:
+        where, names = _where(model)
+        yield prepare(f'DELETE FROM {model.column_family_name()} WHERE {where}'), [row[name] for name in names]
+    if row['content_hash']:
+        yield prepare(f'DELETE FROM {InvoiceFingerprint.column_family_name()} WHERE fingerprint = ?'), [row['content_hash']]
+
+
+def apply_invoice_action(action, keys, user_id=None):
+    # action: 'archive', 'restore' or 'delete'. keys: {invoice id: key row,
+    # None or exception} as returned by load_invoice_keys/find_invoice_keys.
+    # With user_id, only invoices the user issued or received are changed.
+    # Every statement runs concurrently; returns one result dict per id.
+    results, writes, owners = {}, [], []
+    archived_at = datetime.now()
+    for invoice_id, row in keys.items():
+        if row is None:
+            results[invoice_id] = {'id': str(invoice_id), 'status': 'not_found'}
+            continue
+        if isinstance(row, Exception):
+            results[invoice_id] = {'id': str(invoice_id), 'status': 'failed', 'error': str(row)}
+            continue
+        if user_id is not None and str(user_id) not in [str(row['issuer']), str(row['recipient'])]:
+            results[invoice_id] = {'id': str(invoice_id), 'status': 'forbidden'}
+            continue
+
+        if action == 'archive':
+            statements = update_statements(row, {'archived': True, 'archived_at': archived_at, 'archived_by': str(user_id)})
+        elif action == 'restore':
+            statements = update_statements(row, {'archived': False, 'archived_at': None, 'archived_by': None})
+        else:
+            statements = _delete_statements(row)
+        for statement in statements:
+            writes.append(statement)
+            owners.append(invoice_id)
+        results[invoice_id] = {'id': str(invoice_id), 'status': f'{action}d'}
+
+    for invoice_id, (success, result) in zip(owners, execute_concurrent_statements(writes)):
+        if not success:
+            results[invoice_id] = {'id': str(invoice_id), 'status': 'failed', 'error': str(result)}
+
+    changed = [invoice_id for invoice_id, result in results.items() if result['status'] == f'{action}d']
+    cache.delete_many([invoice_cache_key(invoice_id) for invoice_id in changed])
+    touch_invoice_lists((keys[invoice_id]['issuer'], keys[invoice_id]['recipient']) for invoice_id in set(owners))
+    if action == 'delete' and changed:
+        delete_invoices_index(changed)
+        delete_source_files([keys[invoice_id]['source_file'] for invoice_id in changed])
+    return list(results.values())
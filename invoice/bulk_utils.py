@@ -0,0 +1,351 @@
+import codecs
+import csv
+import json
+import os
+import uuid
+import zipfile
+from datetime import datetime
+import xmltodict
+from itertools import islice
+from cassandra.cqlengine import ValidationError
+from django.conf import settings
+from search.elasticsearch_utils import bulk_index_invoices
+from authentication.party_directory import PartyDirectory
+from .models import Invoice, InvoiceFingerprint
+from .cql_utils import prepare, prepared_insert, insert_values, execute_concurrent_statements
+from .listing_utils import LISTING_MODELS, listing_rows
+from .cache_utils import touch_invoice_lists
+from .mapping_utils import get_mapping_plan
+from .xml_utils import stream_format_invoice
+from .dedup_utils import invoice_fingerprint, file_fingerprint, converted_invoice_number, find_duplicate_invoice
+from .source_storage import store_source_file, delete_source_files
+from .utils import map_csv_rows_to_invoice, group_rows, csv_invoice_key, invoice_summary
+from .parallel_utils import convert_csv_file_parallel
+
+MAX_REPORTED_ERRORS = 100
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_csv_rows(uploaded_file, encoding='utf-8'):
+    # Iterating an UploadedFile yields one line at a time from its chunks, so
+    # the upload is never held in memory as a whole.
+    return csv.DictReader(codecs.iterdecode(uploaded_file, encoding))
+
+
+def claim_fingerprints(claims):
+    # claims: {fingerprint: invoice id}. Each fingerprint is inserted with a
+    # lightweight transaction, concurrently, so a document submitted twice at
+    # once is only written by the ingestion that claimed it. Returns
+    # ({fingerprint: invoice id already holding it}, {fingerprint: exception})
+    # for the ones that were not claimed.
+    fingerprints = list(claims)
+    statement = prepare(
+        f'INSERT INTO {InvoiceFingerprint.column_family_name()} (fingerprint, invoice_id, created_at) '
+        f'VALUES (?, ?, ?) IF NOT EXISTS'
+    )
+    now = datetime.now()
+    results = execute_concurrent_statements([(statement, [fingerprint, claims[fingerprint], now]) for fingerprint in fingerprints])
+    held, errors = {}, {}
+    for fingerprint, (success, rows) in zip(fingerprints, results):
+        if not success:
+            errors[fingerprint] = rows
+            continue
+        row = rows.one()
+        if not row['[applied]']:
+            held[fingerprint] = row['invoice_id']
+    return held, errors
+
+
+def release_fingerprints(fingerprints):
+    statement = prepare(f'DELETE FROM {InvoiceFingerprint.column_family_name()} WHERE fingerprint = ?')
+    execute_concurrent_statements([(statement, [fingerprint]) for fingerprint in fingerprints])
+
+
+def bulk_create_invoices(invoice_datas):
+    # Returns ([(index, created invoice)], [(index, exception)],
+    # [(index, existing invoice id)]), with indexes into invoice_datas.
+    # Entries whose content_hash is already claimed, or repeated within
+    # invoice_datas, are reported as duplicates and not written.
+    statement = prepared_insert(Invoice)
+    instances, failed, duplicates = [], [], []
+    for index, invoice_data in enumerate(invoice_datas):
+        invoice = Invoice.build(invoice_data)
+        try:
+            invoice.validate()
+        except ValidationError as e:
+            failed.append((index, e))
+            continue
+        instances.append((index, invoice))
+
+    claims, candidates = {}, []
+    for index, invoice in instances:
+        if invoice.content_hash in claims:
+            duplicates.append((index, claims[invoice.content_hash]))
+            continue
+        if invoice.content_hash:
+            claims[invoice.content_hash] = invoice.id
+        candidates.append((index, invoice))
+
+    held, claim_errors = claim_fingerprints(claims)
+    new_instances = []
+    for index, invoice in candidates:
+        if invoice.content_hash in held:
+            duplicates.append((index, held[invoice.content_hash]))
+        elif invoice.content_hash in claim_errors:
+            failed.append((index, claim_errors[invoice.content_hash]))
+        else:
+            new_instances.append((index, invoice))
+
+    directory = PartyDirectory(cached=False)
+    directory.prime({invoice.issuer for _, invoice in new_instances}, {invoice.recipient for _, invoice in new_instances})
+    for _, invoice in new_instances:
+        for name, value in directory.snapshot(invoice.issuer, invoice.recipient).items():
+            setattr(invoice, name, value)
+
+    # Each invoice is written together with its listing rows; it only counts
+    # as created when every one of those writes succeeded.
+    writes_per_invoice = 1 + len(LISTING_MODELS)
+    writes = []
+    for _, invoice in new_instances:
+        writes.append((statement, insert_values(invoice)))
+        for row in listing_rows(invoice):
+            writes.append((prepared_insert(type(row)), insert_values(row)))
+    results = execute_concurrent_statements(writes)
+    # Failed invoices may still have some rows written.
+    touch_invoice_lists((invoice.issuer, invoice.recipient) for _, invoice in new_instances)
+
+    created = []
+    for position, (index, invoice) in enumerate(new_instances):
+        outcomes = results[position * writes_per_invoice:(position + 1) * writes_per_invoice]
+        error = next((result for success, result in outcomes if not success), None)
+        if error is None:
+            created.append((index, invoice))
+        else:
+            failed.append((index, error))
+
+    # Claims of invoices that were not written are released so a retry can
+    # store them.
+    created_ids = {invoice.id for _, invoice in created}
+    release_fingerprints([invoice.content_hash for _, invoice in new_instances if invoice.content_hash and invoice.id not in created_ids])
+    return created, failed, duplicates
+
+
+def index_created_invoices(invoices):
+    return bulk_index_invoices(
+        (invoice.get_internal_format(), invoice.issuer, invoice.recipient, invoice.id, invoice.party_snapshot())
+        for invoice in invoices
+    )
+
+
+class IngestResult:
+    # Counts outcomes and keeps the first MAX_REPORTED_ERRORS errors. With
+    # report_all, created, failed and duplicate entries are listed in
+    # `results`, up to INGESTION_REPORT_MAX_RESULTS of them; the rest are
+    # only counted.
+    def __init__(self, position_name='row', report_all=False):
+        self.position_name = position_name
+        self.created = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.errors = []
+        self.results = [] if report_all else None
+        self.max_results = getattr(settings, 'INGESTION_REPORT_MAX_RESULTS', 1000)
+
+    def add_result(self, entry):
+        if len(self.results) < self.max_results:
+            self.results.append(entry)
+
+    def add_created(self, position, invoice):
+        self.created += 1
+        if self.results is not None:
+            self.add_result({self.position_name: position, 'status': 'created', 'id': str(invoice.id)})
+
+    def add_error(self, position, error):
+        self.failed += 1
+        if self.results is not None:
+            self.add_result({self.position_name: position, 'status': 'failed', 'error': str(error)})
+        elif len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({self.position_name: position, 'error': str(error)})
+
+    def add_duplicate(self, position, invoice_id):
+        self.duplicates += 1
+        if self.results is not None:
+            self.add_result({self.position_name: position, 'status': 'duplicate', 'id': str(invoice_id)})
+
+    def reported(self):
+        return len(self.results) if self.results is not None else len(self.errors)
+
+    def flush(self, final=False):
+        # Called after every chunk, and with final=True once the input is
+        # done; JobIngestResult stores progress here.
+        pass
+
+    def to_dict(self):
+        if self.results is not None:
+            return {
+                'created': self.created, 'failed': self.failed, 'duplicates': self.duplicates,
+                'results': self.results,
+                'results_truncated': self.created + self.failed + self.duplicates > len(self.results),
+            }
+        return {'created': self.created, 'failed': self.failed, 'duplicates': self.duplicates, 'errors': self.errors}
+
+
+def ingest_invoice_chunks(chunks, result=None):
+    # chunks: iterable of [(position, invoice_data)]. Each chunk is written to
+    # Cassandra and sent to Elasticsearch in one bulk request before the next
+    # one is read, so memory stays bounded by the chunk size.
+    result = result or IngestResult()
+    for chunk in chunks:
+        created, failed, duplicates = bulk_create_invoices([invoice_data for _, invoice_data in chunk])
+        for index, invoice_id in duplicates:
+            result.add_duplicate(chunk[index][0], invoice_id)
+        for index, error in failed:
+            result.add_error(chunk[index][0], error)
+        for index, invoice in created:
+            result.add_created(chunk[index][0], invoice)
+        if created:
+            index_created_invoices([invoice for _, invoice in created])
+        result.flush()
+    return result
+
+
+def map_csv_groups(groups, organization_id, supplier_id, result):
+    for position, rows in groups:
+        try:
+            yield position, map_csv_rows_to_invoice(rows, organization_id, supplier_id)
+        except (ValueError, TypeError) as e:
+            result.add_error(position, e)
+
+
+def ingest_csv(uploaded_file, organization_id, supplier_id, chunk_size=None, workers=None, result=None, source_path=None):
+    chunk_size = chunk_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', 500)
+    lookahead = getattr(settings, 'BULK_UPLOAD_GROUP_LOOKAHEAD', 64)
+    workers = workers or getattr(settings, 'BULK_UPLOAD_WORKERS', None) or os.cpu_count() or 1
+    parallel_min_bytes = getattr(settings, 'BULK_UPLOAD_PARALLEL_MIN_BYTES', 16 * 1024 * 1024)
+    result = result or IngestResult()
+
+    # source_path is the upload's path on the local filesystem, when it has
+    # one; it lets worker processes read their own byte ranges of a large
+    # file. Otherwise the file is converted on the calling thread.
+    if workers > 1 and source_path and os.path.getsize(source_path) >= parallel_min_bytes:
+        chunk_bytes = getattr(settings, 'BULK_UPLOAD_PARALLEL_CHUNK_BYTES', 4 * 1024 * 1024)
+        converted = convert_csv_file_parallel(
+            source_path, organization_id, supplier_id,
+            lookahead, workers, chunk_bytes, result,
+        )
+    else:
+        # Data rows are numbered from 2; row 1 is the CSV header.
+        rows = enumerate(iter_csv_rows(uploaded_file), start=2)
+        groups = group_rows(rows, csv_invoice_key, lookahead)
+        converted = map_csv_groups(groups, organization_id, supplier_id, result)
+    return ingest_invoice_chunks(chunked(converted, chunk_size), result)
+
+
+def parse_source_invoice(content, name=''):
+    if isinstance(content, bytes):
+        is_xml = content.lstrip()[:1] == b'<'
+    else:
+        is_xml = content.lstrip().startswith('<')
+    if name.lower().endswith('.xml') or is_xml:
+        return xmltodict.parse(content)
+    return json.loads(content)
+
+
+def _ndjson_loader(line):
+    def load():
+        document = json.loads(line)
+        # A line may also carry an XML invoice as a JSON string.
+        if isinstance(document, str):
+            return parse_source_invoice(document)
+        return document
+    return load
+
+
+def _archive_loader(archive, info):
+    def load():
+        with archive.open(info) as member:
+            return parse_source_invoice(member.read(), info.filename)
+    return load
+
+
+def iter_source_documents(uploaded_file):
+    # Yields (entry name, loader) pairs. Loaders parse one document when
+    # called, so only the entry being converted is ever held in memory.
+    if uploaded_file.name.lower().endswith('.zip'):
+        with zipfile.ZipFile(uploaded_file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(('.xml', '.json')):
+                    continue
+                yield info.filename, _archive_loader(archive, info)
+    else:
+        for line_number, line in enumerate(uploaded_file, start=1):
+            if line.strip():
+                yield f'line {line_number}', _ndjson_loader(line)
+
+
+def map_source_documents(entries, organization_id, supplier_id, result):
+    plan = get_mapping_plan(supplier_id)
+    for position, load in entries:
+        try:
+            source_invoice = load()
+            converted_invoice = plan.extract(source_invoice)
+            invoice_data = {
+                'issuer': supplier_id,
+                'recipient': organization_id,
+                'source_format': json.dumps(source_invoice),
+                'internal_format': json.dumps(converted_invoice),
+                'content_hash': invoice_fingerprint(supplier_id, converted_invoice_number(converted_invoice), source_invoice),
+                **invoice_summary(converted_invoice),
+            }
+        except Exception as e:
+            result.add_error(position, e)
+            continue
+        yield position, invoice_data
+
+
+def ingest_documents(uploaded_file, organization_id, supplier_id, chunk_size=None, result=None):
+    chunk_size = chunk_size or getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', 500)
+    result = result or IngestResult(position_name='document', report_all=True)
+    converted = map_source_documents(iter_source_documents(uploaded_file), organization_id, supplier_id, result)
+    return ingest_invoice_chunks(chunked(converted, chunk_size), result)
+
+
+def ingest_xml(source_file, organization_id, supplier_id, result=None):
+    # One large XML invoice, mapped item by item with stream_format_invoice.
+    # The raw XML is hashed and copied to file storage in chunks and the
+    # invoice keeps its path in source_file, so the document is never held
+    # in memory whole.
+    result = result or IngestResult(position_name='document', report_all=True)
+    name = os.path.basename(source_file.name)
+    converted_invoice = stream_format_invoice(source_file, get_mapping_plan(supplier_id))
+    content_hash = file_fingerprint(supplier_id, converted_invoice_number(converted_invoice), source_file)
+    existing_invoice_id = find_duplicate_invoice(content_hash)
+    if existing_invoice_id:
+        result.add_duplicate(name, existing_invoice_id)
+        result.flush()
+        return result
+
+    invoice_id = uuid.uuid4()
+    invoice_data = {
+        'id': invoice_id,
+        'issuer': supplier_id,
+        'recipient': organization_id,
+        'source_file': store_source_file(invoice_id, name, source_file),
+        'internal_format': json.dumps(converted_invoice),
+        'content_hash': content_hash,
+        **invoice_summary(converted_invoice),
+    }
+    created = result.created
+    try:
+        ingest_invoice_chunks([[(name, invoice_data)]], result)
+    finally:
+        if result.created == created:
+            delete_source_files([invoice_data['source_file']])
+    return result
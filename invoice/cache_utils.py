@@ -0,0 +1,44 @@
+from uuid import UUID
+from django.conf import settings
+from django.core.cache import cache
+from synth_invo_analyzer.cache import is_shared_cache
+from synth_invo_analyzer.versioning import bump_versions
+
+
+def invoice_cache_key(invoice_id):
+    return f'invoice:detail:{invoice_id}'
+
+
+def get_cached_invoice(invoice_id, load):
+    # Read-through: load() builds the serialized invoice on a miss. Callers
+    # that change an invoice must call invalidate_cached_invoice. That only
+    # reaches other workers through a shared cache, so without one every
+    # read loads.
+    if not is_shared_cache():
+        return load()
+    key = invoice_cache_key(invoice_id)
+    data = cache.get(key)
+    if data is None:
+        data = load()
+        cache.set(key, data, getattr(settings, 'INVOICE_DETAIL_CACHE_TTL', 300))
+    return data
+
+
+def invalidate_cached_invoice(invoice_id):
+    cache.delete(invoice_cache_key(invoice_id))
+
+
+def invoice_list_scope(party_type, party_id):
+    # Version scope of one supplier's or organization's invoice listings.
+    # Ids are normalized so a query-string id in another spelling (upper
+    # case, no hyphens) names the same scope writers bump.
+    return f'invoices:{party_type}:{UUID(str(party_id))}'
+
+
+def touch_invoice_lists(parties):
+    # parties: (issuer, recipient) pairs of changed invoices.
+    scopes = set()
+    for issuer, recipient in parties:
+        scopes.add(invoice_list_scope('supplier', issuer))
+        scopes.add(invoice_list_scope('organization', recipient))
+    bump_versions(scopes)
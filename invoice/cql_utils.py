@@ -0,0 +1,101 @@
+import base64
+from cassandra.concurrent import execute_concurrent
+from cassandra.query import UNSET_VALUE
+from cassandra.cqlengine import connection
+from django.conf import settings
+from django.core import signing
+
+_prepared_statements = {}
+
+
+def prepare(query):
+    session = connection.get_session()
+    key = (query, id(session))
+    if key not in _prepared_statements:
+        _prepared_statements[key] = session.prepare(query)
+    return _prepared_statements[key]
+
+
+def prepared_insert(model):
+    columns = [column.db_field_name for column in model._columns.values()]
+    return prepare(
+        f'INSERT INTO {model.column_family_name()} ({", ".join(columns)}) '
+        f'VALUES ({", ".join("?" for _ in columns)})'
+    )
+
+
+def insert_values(instance):
+    # Unset columns are left out of the write instead of being bound as null,
+    # which would store a tombstone for every empty column.
+    values = []
+    for name, column in instance._columns.items():
+        value = getattr(instance, name)
+        values.append(UNSET_VALUE if value is None else column.to_database(value))
+    return values
+
+
+def execute_concurrent_statements(statement_and_values):
+    # statement_and_values: [(prepared statement, values)]. Returns one
+    # (success, result or exception) pair per statement, in order.
+    if not statement_and_values:
+        return []
+    session = connection.get_session()
+    concurrency = getattr(settings, 'CASSANDRA_WRITE_CONCURRENCY', 50)
+    return execute_concurrent(session, statement_and_values, concurrency=concurrency, raise_on_first_error=False)
+
+
+def encode_cursor(paging_state, scope):
+    token = base64.urlsafe_b64encode(paging_state).decode('ascii')
+    return signing.Signer(salt=f'invoice-page:{scope}').sign(token)
+
+
+def decode_cursor(cursor, scope):
+    # Cursors are signed and tied to the query they came from, so a client
+    # can neither forge one nor replay it against another partition.
+    # Raises signing.BadSignature otherwise.
+    token = signing.Signer(salt=f'invoice-page:{scope}').unsign(cursor)
+    return base64.urlsafe_b64decode(token.encode('ascii'))
+
+
+def _page_statement(model, filters, allow_filtering=False, columns=None):
+    # Returns the bound SELECT and the scope string cursors are signed with.
+    names = list(filters)
+    selected = ', '.join(model._columns[name].db_field_name for name in columns) if columns else '*'
+    query = f'SELECT {selected} FROM {model.column_family_name()} WHERE ' + ' AND '.join(
+        f'{model._columns[name].db_field_name} = ?' for name in names
+    )
+    if allow_filtering:
+        query += ' ALLOW FILTERING'
+    values = [model._columns[name].to_database(filters[name]) for name in names]
+    scope = f'{model.column_family_name()}:' + ','.join(f'{name}={value}' for name, value in zip(names, values))
+    return prepare(query).bind(values), scope
+
+
+def _execute_page(model, statement, limit, paging_state):
+    statement.fetch_size = limit
+    result = connection.get_session().execute(statement, paging_state=paging_state)
+    return [model._construct_instance(row) for row in result.current_rows], result.paging_state
+
+
+def fetch_page(model, filters, limit, cursor=None, allow_filtering=False, columns=None):
+    # Reads one page of `model` rows matching the equality filters using the
+    # driver's paging state, so every page costs one bounded read wherever
+    # it is in the result. `columns` limits the selected columns; the others
+    # are None on the returned instances. Returns (instances, next cursor or
+    # None).
+    statement, scope = _page_statement(model, filters, allow_filtering, columns)
+    paging_state = decode_cursor(cursor, scope) if cursor else None
+    instances, next_paging_state = _execute_page(model, statement, limit, paging_state)
+    return instances, encode_cursor(next_paging_state, scope) if next_paging_state else None
+
+
+def iter_pages(model, filters, page_size, allow_filtering=False, columns=None):
+    # Yields every matching row, one page (list of instances) at a time.
+    statement, _ = _page_statement(model, filters, allow_filtering, columns)
+    paging_state = None
+    while True:
+        instances, paging_state = _execute_page(model, statement, page_size, paging_state)
+        if instances:
+            yield instances
+        if not paging_state:
+            return
@@ -0,0 +1,82 @@
+import hashlib
+import json
+from cassandra.cqlengine.query import LWTException
+from .models import InvoiceFingerprint, IdempotencyKey
+
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def invoice_fingerprint(issuer, invoice_number, source_invoice):
+    # source_invoice is a parsed document, or raw text for sources that are
+    # stored as-is (streamed XML).
+    content = source_invoice if isinstance(source_invoice, str) else canonical_json(source_invoice)
+    digest = hashlib.sha256()
+    for part in (str(issuer), str(invoice_number or ''), content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def file_fingerprint(issuer, invoice_number, source_file, chunk_size=1024 * 1024):
+    # invoice_fingerprint of raw document bytes, read chunk by chunk.
+    digest = hashlib.sha256()
+    for part in (str(issuer), str(invoice_number or '')):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    source_file.seek(0)
+    for chunk in iter(lambda: source_file.read(chunk_size), b''):
+        digest.update(chunk)
+    digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def converted_invoice_number(converted_invoice):
+    return converted_invoice.get('invoice', {}).get('header', {}).get('invoice_number')
+
+
+def find_duplicate_invoice(fingerprint):
+    entry = InvoiceFingerprint.objects.filter(fingerprint=fingerprint).first()
+    return entry.invoice_id if entry else None
+
+
+def claim_fingerprint(fingerprint, invoice_id):
+    # Records fingerprint -> invoice_id with a lightweight transaction, so of
+    # two concurrent submissions of one document only one claims it. Returns
+    # the invoice id already holding the fingerprint, or None when this call
+    # claimed it; the claimant then writes the invoice.
+    try:
+        InvoiceFingerprint.if_not_exists().create(fingerprint=fingerprint, invoice_id=invoice_id)
+    except LWTException as e:
+        return e.existing['invoice_id']
+    return None
+
+
+def forget_fingerprint(fingerprint):
+    if fingerprint:
+        InvoiceFingerprint.objects.filter(fingerprint=fingerprint).delete()
+
+
+def claim_idempotency_key(issuer, idempotency_key, kind, target_id):
+    # Like claim_fingerprint for a client's Idempotency-Key. Returns the
+    # (kind, target id) already stored under the key, or None when this call
+    # claimed it or no key was sent.
+    if not idempotency_key:
+        return None
+    try:
+        IdempotencyKey.if_not_exists().create(issuer=issuer, idempotency_key=idempotency_key, kind=kind, target_id=target_id)
+    except LWTException as e:
+        return e.existing['kind'], e.existing['target_id']
+    return None
+
+
+def record_idempotency_key(issuer, idempotency_key, kind, target_id):
+    if idempotency_key:
+        IdempotencyKey.create(issuer=issuer, idempotency_key=idempotency_key, kind=kind, target_id=target_id)
+
+
+def release_idempotency_key(issuer, idempotency_key):
+    # Frees a key whose request failed, so the client can retry with it.
+    if idempotency_key:
+        IdempotencyKey.objects.filter(issuer=issuer, idempotency_key=idempotency_key).delete()
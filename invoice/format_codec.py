@@ -0,0 +1,29 @@
+import zlib
+from django.conf import settings
+
+# format_encoding values. 'json' (or no marker, for rows written before
+# encodings existed) keeps the text columns; 'zlib' stores compressed UTF-8
+# in the blob columns.
+FORMAT_ENCODINGS = ('json', 'zlib')
+
+
+def default_format_encoding():
+    return getattr(settings, 'INVOICE_FORMAT_ENCODING', 'json')
+
+
+def encode_format(text, encoding):
+    if text is None:
+        return None
+    if encoding == 'zlib':
+        return zlib.compress(text.encode('utf-8'), getattr(settings, 'INVOICE_FORMAT_ZLIB_LEVEL', 6))
+    raise ValueError(f'Unknown invoice format encoding: {encoding}')
+
+
+def decode_format(encoding, text, blob):
+    if not encoding or encoding == 'json':
+        return text
+    if blob is None:
+        return None
+    if encoding == 'zlib':
+        return zlib.decompress(blob).decode('utf-8')
+    raise ValueError(f'Unknown invoice format encoding: {encoding}')
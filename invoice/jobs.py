@@ -0,0 +1,84 @@
+import json
+import os
+import uuid
+from datetime import datetime
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import IngestionJob
+from .bulk_utils import IngestResult, ingest_csv, ingest_documents, ingest_xml
+
+INGESTERS = {
+    'csv': ingest_csv,
+    'documents': ingest_documents,
+    'xml': ingest_xml,
+}
+
+
+class JobIngestResult(IngestResult):
+    # Writes counters to the job row after every chunk, so the status
+    # endpoint shows progress while the job runs. The report, which is
+    # capped, is only rewritten when entries were added to it and once more
+    # at the end.
+    def __init__(self, job, **kwargs):
+        super().__init__(**kwargs)
+        self.job = job
+        self.flushed_entries = None
+
+    def flush(self, final=False):
+        values = {'created': self.created, 'failed': self.failed, 'duplicates': self.duplicates}
+        if final or self.reported() != self.flushed_entries:
+            values['report'] = json.dumps(self.to_dict())
+            self.flushed_entries = self.reported()
+        self.job.update(**values)
+
+
+def create_ingestion_job(kind, uploaded_file, organization_id, supplier_id, job_id=None):
+    # Stores the upload and records a queued job; the caller dispatches
+    # run_ingestion_job with the job id.
+    job = IngestionJob(
+        id=job_id or uuid.uuid4(),
+        kind=kind,
+        issuer=supplier_id,
+        recipient=organization_id,
+        file_name=uploaded_file.name,
+        file_size=uploaded_file.size,
+    )
+    job.validate()
+    upload_dir = getattr(settings, 'INGESTION_UPLOAD_DIR', 'ingestion')
+    job.file_path = default_storage.save(f'{upload_dir}/{job.id}/{os.path.basename(uploaded_file.name)}', uploaded_file)
+    job.save()
+    return job
+
+
+def local_storage_path(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def process_ingestion_job(job_id):
+    job = IngestionJob.objects.get(id=job_id)
+    # A redelivered task must not ingest a finished upload a second time.
+    if job.status in ('completed', 'failed'):
+        return
+    job.update(status='running', started_at=datetime.now())
+
+    if job.kind == 'csv':
+        result = JobIngestResult(job)
+    else:
+        result = JobIngestResult(job, position_name='document', report_all=True)
+    # CSV conversion can fan out to worker processes when the stored upload
+    # is a local file.
+    options = {'source_path': local_storage_path(job.file_path)} if job.kind == 'csv' else {}
+    try:
+        with default_storage.open(job.file_path, 'rb') as source_file:
+            INGESTERS[job.kind](source_file, str(job.recipient), str(job.issuer), result=result, **options)
+    except Exception as e:
+        print(e)
+        result.flush(final=True)
+        job.update(status='failed', error=str(e), finished_at=datetime.now())
+    else:
+        result.flush(final=True)
+        job.update(status='completed', finished_at=datetime.now())
+    default_storage.delete(job.file_path)
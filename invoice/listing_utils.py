@@ -0,0 +1,61 @@
+from cassandra.cqlengine.query import BatchQuery
+from .models import InvoiceBySupplier, InvoiceByOrganization
+from .source_storage import delete_source_files
+from .cache_utils import invalidate_cached_invoice, touch_invoice_lists
+
+# Denormalized copies of Invoice, one partition per supplier / organization,
+# newest first. Every write to Invoice must go through the helpers below so
+# the copies, the cached invoice detail and the listing versions stay in step.
+LISTING_MODELS = (InvoiceBySupplier, InvoiceByOrganization)
+
+
+def listing_rows(invoice):
+    for model in LISTING_MODELS:
+        yield model(**{name: getattr(invoice, name) for name in model._columns})
+
+
+def listing_query(model, invoice):
+    return model.objects.filter(**{name: getattr(invoice, name) for name in model._primary_keys})
+
+
+def create_invoice_with_listings(invoice):
+    with BatchQuery() as batch:
+        invoice.batch(batch).save()
+        for row in listing_rows(invoice):
+            row.batch(batch).save()
+    touch_invoice_lists([(invoice.issuer, invoice.recipient)])
+    return invoice
+
+
+def save_archive_state(invoice):
+    with BatchQuery() as batch:
+        invoice.batch(batch).save()
+        for model in LISTING_MODELS:
+            listing_query(model, invoice).batch(batch).update(
+                archived=invoice.archived,
+                archived_at=invoice.archived_at,
+                archived_by=invoice.archived_by,
+            )
+    invalidate_cached_invoice(invoice.id)
+    touch_invoice_lists([(invoice.issuer, invoice.recipient)])
+
+
+def save_invoice_formats(invoice):
+    # Re-encoding keeps the documents' content, so list versions stay.
+    with BatchQuery() as batch:
+        invoice.batch(batch).save()
+        for model in LISTING_MODELS:
+            listing_query(model, invoice).batch(batch).update(
+                **{name: getattr(invoice, name) for name in invoice.FORMAT_FIELDS}
+            )
+    invalidate_cached_invoice(invoice.id)
+
+
+def delete_invoice_with_listings(invoice):
+    with BatchQuery() as batch:
+        invoice.batch(batch).delete()
+        for model in LISTING_MODELS:
+            listing_query(model, invoice).batch(batch).delete()
+    delete_source_files([invoice.source_file])
+    invalidate_cached_invoice(invoice.id)
+    touch_invoice_lists([(invoice.issuer, invoice.recipient)])
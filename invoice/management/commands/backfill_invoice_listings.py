@@ -0,0 +1,32 @@
+import json
+from django.core.management.base import BaseCommand
+from invoice.models import Invoice
+from invoice.listing_utils import listing_rows
+from invoice.utils import invoice_summary
+
+
+class Command(BaseCommand):
+    help = 'Copy existing invoices into the invoices_by_supplier and invoices_by_organization tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fetch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        copied = summarized = 0
+        # Listing rows are upserts, so the command can be re-run safely.
+        for invoice in Invoice.objects.all().fetch_size(options['fetch_size']):
+            if invoice.invoice_number is None and invoice.get_internal_format():
+                # Rows written before the summary columns existed.
+                for name, value in invoice_summary(json.loads(invoice.get_internal_format())).items():
+                    setattr(invoice, name, value)
+                invoice.save()
+                summarized += 1
+            for row in listing_rows(invoice):
+                row.save()
+            copied += 1
+            if copied % 1000 == 0:
+                self.stdout.write(f'{copied} invoices copied')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{copied} invoices copied to the listing tables, {summarized} summaries filled in'
+        ))
@@ -0,0 +1,43 @@
+import json
+import timeit
+from django.core.management.base import BaseCommand
+from invoice.models import Invoice
+from invoice.mapping_utils import MappingPlan
+from .benchmark_mapping import SAMPLE_MAPPING, sample_invoice
+
+
+class Command(BaseCommand):
+    help = 'Compare stored size and encode/decode throughput of the invoice format encodings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        plan = MappingPlan(SAMPLE_MAPPING)
+        for item_count in options['items']:
+            source_invoice = sample_invoice(item_count)
+            source_format = json.dumps(source_invoice)
+            internal_format = json.dumps(plan.extract(source_invoice))
+            number = max(1, 2000 // (item_count + 1))
+
+            for encoding in ('json', 'zlib'):
+                invoice = Invoice()
+
+                def write():
+                    invoice.set_formats(source_format, internal_format, encoding)
+
+                def read():
+                    invoice.get_source_format()
+                    invoice.get_internal_format()
+
+                write()
+                stored = sum(len(value.encode('utf-8') if isinstance(value, str) else value) for value in (
+                    invoice.source_format, invoice.internal_format, invoice.source_blob, invoice.internal_blob,
+                ) if value is not None)
+                write_time = min(timeit.repeat(write, number=number, repeat=options['repeat'])) / number
+                read_time = min(timeit.repeat(read, number=number, repeat=options['repeat'])) / number
+                self.stdout.write(
+                    f'{item_count:>6} items  {encoding:<5} {stored:>10} bytes  '
+                    f'write {1 / write_time:10.0f}/s  read {1 / read_time:10.0f}/s'
+                )
@@ -0,0 +1,54 @@
+import json
+import timeit
+import uuid
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from invoice.models import Invoice
+from invoice.mapping_utils import MappingPlan
+from invoice.serializers import InvoiceSerializer
+from synth_invo_analyzer.raw_json import dumps, embed
+from .benchmark_mapping import SAMPLE_MAPPING, sample_invoice
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of rendering an invoice listing page with internal_format as a string, re-parsed, or embedded raw.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        plan = MappingPlan(SAMPLE_MAPPING)
+        renderer = JSONRenderer()
+        for item_count in options['items']:
+            source_invoice = sample_invoice(item_count)
+            invoices = []
+            for _ in range(options['page_size']):
+                invoice = Invoice(
+                    id=uuid.uuid4(), issuer=uuid.uuid4(), recipient=uuid.uuid4(), created_at=datetime.now(),
+                    issuer_name='Acme Supplies', supplier_logo_url='', recipient_name='Globex',
+                )
+                invoice.set_formats(json.dumps(source_invoice), json.dumps(plan.extract(source_invoice)), 'json')
+                invoices.append(invoice)
+            rows = InvoiceSerializer(invoices, many=True).data
+
+            modes = {
+                'string': lambda: renderer.render({'invoices': rows, 'next_cursor': None}),
+                'reparsed': lambda: renderer.render({
+                    'invoices': [dict(row, internal_format=json.loads(row['internal_format'])) for row in rows],
+                    'next_cursor': None,
+                }),
+                'embedded': lambda: dumps({
+                    'invoices': [embed(row, ('internal_format',)) for row in rows],
+                    'next_cursor': None,
+                }),
+            }
+            number = max(1, 200 // (item_count + 1))
+            for name, render in modes.items():
+                size = len(render())
+                elapsed = min(timeit.repeat(render, number=number, repeat=options['repeat'])) / number
+                self.stdout.write(
+                    f'{item_count:>6} items  {name:<9} {size:>10} bytes  {elapsed * 1000:9.2f} ms/page'
+                )
@@ -0,0 +1,67 @@
+import json
+import timeit
+from django.core.management.base import BaseCommand, CommandError
+from invoice.mapping_utils import MappingPlan, map_invoice_fields
+
+
+SAMPLE_MAPPING = {
+    "invoice_number": "Invoice.Header.Number",
+    "invoice_date": "Invoice.Header.Date",
+    "due_date": "Invoice.Header.DueDate",
+    "currency": "Invoice.Header.Currency",
+    "seller.company_name": "Invoice.Seller.Name",
+    "seller.address.street": "Invoice.Seller.Address.Street",
+    "seller.address.city": "Invoice.Seller.Address.City",
+    "seller.contact.email": "Invoice.Seller.Contact.Email",
+    "buyer.company_name": "Invoice.Buyer.Name",
+    "buyer.address.city": "Invoice.Buyer.Address.City",
+    "summary.subtotal": "Invoice.Summary.Subtotal",
+    "summary.tax_amount": "Invoice.Summary.Tax",
+    "summary.total_amount": "Invoice.Summary.Total",
+    "notes.note": "Invoice.Note",
+    "items.list": [
+        "Invoice.Items.Item",
+        {"description": "Description", "quantity": "Quantity", "unit_price": "Price.Unit", "total_price": "Price.Total"},
+    ],
+}
+
+
+def sample_invoice(item_count):
+    return {
+        "Invoice": {
+            "Header": {"Number": "INV-0001", "Date": "2024-01-31", "DueDate": "2024-02-29", "Currency": "USD"},
+            "Seller": {"Name": "Acme Supplies", "Address": {"Street": "1 Main St", "City": "Colombo"}, "Contact": {"Email": "sales@acme.test"}},
+            "Buyer": {"Name": "Globex", "Address": {"City": "Kandy"}},
+            "Summary": {"Subtotal": "$12,000.00", "Tax": "1,200.00", "Total": "$13,200.00"},
+            "Note": "Thank you",
+            "Items": {
+                "Item": [
+                    {"Description": f"Item {i}", "Quantity": str(i % 10 + 1), "Price": {"Unit": "$1,200.00", "Total": "$2,400.00"}}
+                    for i in range(item_count)
+                ]
+            },
+        }
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare per-field map_field walks with the compiled MappingPlan on synthetic invoices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        plan = MappingPlan(SAMPLE_MAPPING)
+        for item_count in options['items']:
+            invoice = sample_invoice(item_count)
+            if json.dumps(plan.extract(invoice)) != json.dumps(map_invoice_fields(invoice, SAMPLE_MAPPING)):
+                raise CommandError(f'MappingPlan output differs from map_field output for {item_count} items')
+
+            number = max(1, 10000 // (item_count + 1))
+            per_field = min(timeit.repeat(lambda: map_invoice_fields(invoice, SAMPLE_MAPPING), number=number, repeat=options['repeat'])) / number
+            compiled = min(timeit.repeat(lambda: plan.extract(invoice), number=number, repeat=options['repeat'])) / number
+            self.stdout.write(
+                f'{item_count:>6} items  map_field {per_field * 1000:9.3f} ms  '
+                f'plan {compiled * 1000:9.3f} ms  speedup {per_field / compiled:5.2f}x'
+            )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from invoice.models import Invoice
+from invoice.listing_utils import save_invoice_formats
+from invoice.format_codec import FORMAT_ENCODINGS, default_format_encoding
+
+
+class Command(BaseCommand):
+    help = 'Rewrite stored invoices and their listing rows with the given source/internal format encoding.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--encoding', default=None, help='Target encoding; defaults to INVOICE_FORMAT_ENCODING.')
+        parser.add_argument('--fetch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also rewrite invoices already in the target encoding, to bring their listing rows in line.',
+        )
+
+    def handle(self, *args, **options):
+        encoding = options['encoding'] or default_format_encoding()
+        if encoding not in FORMAT_ENCODINGS:
+            raise CommandError(f'Unknown encoding {encoding!r}; expected one of {", ".join(FORMAT_ENCODINGS)}')
+        target_marker = None if encoding == 'json' else encoding
+
+        scanned = rewritten = 0
+        # Rows are read page by page, so the table is never loaded at once.
+        for invoice in Invoice.objects.all().fetch_size(options['fetch_size']):
+            scanned += 1
+            if invoice.format_encoding == target_marker and not options['all']:
+                continue
+            rewritten += 1
+            if not options['dry_run']:
+                # Documents in file storage stay there.
+                source_format = None if invoice.source_file else invoice.get_source_format()
+                invoice.set_formats(source_format, invoice.get_internal_format(), encoding)
+                save_invoice_formats(invoice)
+            if rewritten % 1000 == 0:
+                self.stdout.write(f'{rewritten} invoices rewritten ({scanned} scanned)')
+
+        self.stdout.write(self.style.SUCCESS(f'{rewritten} of {scanned} invoices rewritten to {encoding}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from authentication.models import Supplier, Organization
+from invoice.snapshot_utils import reconcile_party_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the party snapshot columns and search fields of every invoice.'
+
+    def handle(self, *args, **options):
+        for party_type, model in (('supplier', Supplier), ('organization', Organization)):
+            for party_id in model.objects.values_list('id', flat=True).iterator():
+                rewritten = reconcile_party_snapshots(party_type, party_id)
+                if rewritten:
+                    self.stdout.write(f'{party_type} {party_id}: {rewritten} invoices')
+
+        self.stdout.write(self.style.SUCCESS('Party snapshots reconciled'))
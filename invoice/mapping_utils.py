@@ -0,0 +1,270 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from invoice_template.models import Template
+from synth_invo_analyzer.cache import LRUCache, is_shared_cache
+
+# (output path, mapping key, default mapping, data type) in the order the
+# fields appear in the internal invoice format. The ('items',) entry points at
+# the source item list; each item is mapped with ITEM_FIELD_SPECS.
+FIELD_SPECS = (
+    (('header', 'invoice_number'), 'invoice_number', '', None),
+    (('header', 'invoice_date'), 'invoice_date', '', None),
+    (('header', 'due_date'), 'due_date', '', None),
+    (('header', 'currency'), 'currency', '', None),
+    (('seller', 'company_name'), 'seller.company_name', '', None),
+    (('seller', 'address', 'street'), 'seller.address.street', '', None),
+    (('seller', 'address', 'city'), 'seller.address.city', '', None),
+    (('seller', 'address', 'state'), 'seller.address.state', '', None),
+    (('seller', 'address', 'zip_code'), 'seller.address.zip_code', '', None),
+    (('seller', 'address', 'country'), 'seller.address.country', '', None),
+    (('seller', 'contact', 'name'), 'seller.contact.name', '', None),
+    (('seller', 'contact', 'phone'), 'seller.contact.phone', '', None),
+    (('seller', 'contact', 'email'), 'seller.contact.email', '', None),
+    (('buyer', 'company_name'), 'buyer.company_name', '', None),
+    (('buyer', 'address', 'street'), 'buyer.address.street', '', None),
+    (('buyer', 'address', 'city'), 'buyer.address.city', '', None),
+    (('buyer', 'address', 'state'), 'buyer.address.state', '', None),
+    (('buyer', 'address', 'zip_code'), 'buyer.address.zip_code', '', None),
+    (('buyer', 'address', 'country'), 'buyer.address.country', '', None),
+    (('buyer', 'contact', 'name'), 'buyer.contact.name', '', None),
+    (('buyer', 'contact', 'phone'), 'buyer.contact.phone', '', None),
+    (('buyer', 'contact', 'email'), 'buyer.contact.email', '', None),
+    (('items',), 'items.list', None, None),
+    (('summary', 'subtotal'), 'summary.subtotal', 0.0, 'float'),
+    (('summary', 'tax_rate'), 'summary.tax_rate', 0.0, 'float'),
+    (('summary', 'tax_amount'), 'summary.tax_amount', 0.0, 'float'),
+    (('summary', 'total_amount'), 'summary.total_amount', 0.0, 'float'),
+    (('summary', 'discount'), 'summary.discount', 0.0, 'float'),
+    (('payment_instructions', 'bank_name'), 'payment_instructions.bank_name', '', None),
+    (('payment_instructions', 'account_number'), 'payment_instructions.account_number', '', None),
+    (('payment_instructions', 'routing_number'), 'payment_instructions.routing_number', '', None),
+    (('payment_instructions', 'swift'), 'payment_instructions.swift', '', None),
+    (('notes', 'note'), 'notes.note', '', None),
+)
+
+ITEM_FIELD_SPECS = (
+    ('description', None),
+    ('quantity', 'int'),
+    ('unit_price', 'float'),
+    ('total_price', 'float'),
+)
+
+_plan_cache = LRUCache(maxsize=getattr(settings, 'MAPPING_PLAN_CACHE_SIZE', 512))
+# supplier -> mapping version. With a shared cache the version lives there and
+# update_mapping publishes the new one to every worker; otherwise each process
+# keeps its own and the TTL bounds how long another worker can keep serving a
+# mapping that was replaced through update_mapping.
+_version_cache = LRUCache(
+    maxsize=getattr(settings, 'MAPPING_PLAN_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'MAPPING_PLAN_CACHE_TTL', 300),
+)
+
+
+def clean_number_string(number_str: str) -> str:
+    return number_str.replace('$', '').replace(',', '').strip()
+
+
+def compile_path(mapping):
+    if isinstance(mapping, float) or isinstance(mapping, int):
+        return mapping
+    return tuple(mapping.split('.'))
+
+
+def resolve_path(data, path, data_type=None):
+    if not isinstance(path, tuple):
+        return path
+    current_value = data
+    for key in path:
+        current_value = current_value.get(key, '')
+    return coerce_value(current_value, data_type)
+
+
+def map_field(data, mapping, data_type=None):
+    return resolve_path(data, compile_path(mapping), data_type)
+
+
+def coerce_value(value, data_type=None):
+    if isinstance(value, str):
+        value = clean_number_string(value)
+
+    if data_type == 'int':
+        return int(value) if value else 0
+    elif data_type == 'float':
+        return float(value) if value else 0.0
+    return value
+
+
+def map_invoice_fields(invoice, mapping):
+    # Reference mapper: walks every field from the document root. Kept for
+    # benchmarks and to check MappingPlan output against.
+    items_mapping = mapping["items.list"]
+    formatted = {}
+    for output_path, key, default, data_type in FIELD_SPECS:
+        if output_path == ('items',):
+            value = [
+                {name: map_field(item, items_mapping[1][name], item_type) for name, item_type in ITEM_FIELD_SPECS}
+                for item in map_field(invoice, items_mapping[0])
+            ]
+        else:
+            value = map_field(invoice, mapping.get(key, default), data_type)
+        target = formatted
+        for part in output_path[:-1]:
+            target = target.setdefault(part, {})
+        target[output_path[-1]] = value
+    return {"invoice": formatted}
+
+
+def build_trie(paths):
+    # paths: [(slot, compiled path)]. Shared path prefixes are merged so each
+    # node of the source document is looked up once.
+    root = {'slots': [], 'children': {}}
+    for slot, path in paths:
+        node = root
+        for key in path:
+            node = node['children'].setdefault(key, {'slots': [], 'children': {}})
+        node['slots'].append(slot)
+    return root
+
+
+def build_layout(output_paths):
+    root = {}
+    for index, output_path in enumerate(output_paths):
+        target = root
+        for key in output_path[:-1]:
+            target = target.setdefault(key, {})
+        target[output_path[-1]] = index
+    return root
+
+
+def _clean(value):
+    return clean_number_string(value) if isinstance(value, str) else value
+
+
+def _as_int(value):
+    value = _clean(value)
+    return int(value) if value else 0
+
+
+def _as_float(value):
+    value = _clean(value)
+    return float(value) if value else 0.0
+
+
+COERCERS = {None: '_clean', 'int': '_as_int', 'float': '_as_float'}
+
+
+def compile_extractor(fields, extract_item=None):
+    # fields: [(output path, compiled path or constant, data type)]. The path
+    # trie is turned into straight-line Python: one dict lookup per trie node,
+    # one coercion per output slot, and a literal for the output layout. A
+    # data type of 'items' maps each element of the resolved list with
+    # extract_item.
+    expressions = [None] * len(fields)
+    namespace = {
+        '_clean': _clean, '_as_int': _as_int, '_as_float': _as_float,
+        'extract_item': extract_item, 'constants': [],
+    }
+    paths = []
+    for index, (output_path, path, data_type) in enumerate(fields):
+        if isinstance(path, tuple):
+            paths.append(((index, data_type), path))
+        else:
+            expressions[index] = f'constants[{len(namespace["constants"])}]'
+            namespace['constants'].append(path)
+
+    lines = ['def extract(r0):']
+    registers = 0
+    pending = [(0, build_trie(paths))]
+    while pending:
+        register, node = pending.pop()
+        for index, data_type in node['slots']:
+            if data_type == 'items':
+                expressions[index] = f'[extract_item(item) for item in _clean(r{register})]'
+            else:
+                expressions[index] = f'{COERCERS[data_type]}(r{register})'
+        for key, child in node['children'].items():
+            registers += 1
+            lines.append(f'    r{registers} = r{register}.get({key!r}, \'\')')
+            pending.append((registers, child))
+
+    def literal(layout):
+        return '{' + ', '.join(
+            f'{key!r}: ' + (expressions[sub] if isinstance(sub, int) else literal(sub))
+            for key, sub in layout.items()
+        ) + '}'
+
+    lines.append('    return ' + literal(build_layout([field[0] for field in fields])))
+    exec('\n'.join(lines), namespace)
+    return namespace['extract']
+
+
+class MappingPlan:
+    def __init__(self, mapping, version=None):
+        self.version = version
+        items_mapping = mapping["items.list"]
+        self.items_path = compile_path(items_mapping[0])
+        self.extract_item = compile_extractor([
+            ((name,), compile_path(items_mapping[1][name]), data_type)
+            for name, data_type in ITEM_FIELD_SPECS
+        ])
+
+        fields = []
+        for output_path, key, default, data_type in FIELD_SPECS:
+            if output_path == ('items',):
+                fields.append((output_path, self.items_path, 'items'))
+            else:
+                fields.append((output_path, compile_path(mapping.get(key, default)), data_type))
+        self._extract = compile_extractor(fields, self.extract_item)
+
+    def extract(self, invoice):
+        return {"invoice": self._extract(invoice)}
+
+
+def mapping_version(mapping_text):
+    return hashlib.sha1((mapping_text or '').encode('utf-8')).hexdigest()
+
+
+def mapping_version_key(supplier_id):
+    return f'mapping-version:supplier:{supplier_id}'
+
+
+def _get_version(supplier_key):
+    if is_shared_cache():
+        return cache.get(mapping_version_key(supplier_key))
+    return _version_cache.get(supplier_key)
+
+
+def get_mapping_plan(supplier_id):
+    supplier_key = str(supplier_id)
+    version = _get_version(supplier_key)
+    if version is not None:
+        plan = _plan_cache.get((supplier_key, version))
+        if plan is not None:
+            return plan
+
+    template = Template.objects.get(supplier=supplier_id)
+    version = mapping_version(template.mapping)
+    plan = _plan_cache.get((supplier_key, version))
+    if plan is None:
+        plan = MappingPlan(json.loads(template.mapping), version)
+        _plan_cache.set((supplier_key, version), plan)
+    if is_shared_cache():
+        # add, not set: a reader that loaded the template before an update
+        # must not overwrite the version update_mapping just published.
+        cache.add(mapping_version_key(supplier_key), version, getattr(settings, 'MAPPING_PLAN_CACHE_TTL', 300))
+    else:
+        _version_cache.set(supplier_key, version)
+    return plan
+
+
+def invalidate_mapping_plan(supplier_id, mapping_text=None):
+    # Called after a template's mapping is replaced; with a shared cache the
+    # new version is published so every worker rebuilds its plan.
+    supplier_key = str(supplier_id)
+    _version_cache.pop(supplier_key)
+    if is_shared_cache() and mapping_text is None:
+        cache.delete(mapping_version_key(supplier_key))
+    elif is_shared_cache():
+        cache.set(mapping_version_key(supplier_key), mapping_version(mapping_text), getattr(settings, 'MAPPING_PLAN_CACHE_TTL', 300))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0003_delete_archiveinvoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0004_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceFingerprint',
+            fields=[
+            ],
+        ),
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+            ],
+        ),
+    ]
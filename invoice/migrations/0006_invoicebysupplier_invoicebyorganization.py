@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoice', '0005_invoicefingerprint_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceBySupplier',
+            fields=[
+            ],
+        ),
+        migrations.CreateModel(
+            name='InvoiceByOrganization',
+            fields=[
+            ],
+        ),
+    ]
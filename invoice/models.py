@@ -2,16 +2,133 @@ from django_cassandra_engine.models import DjangoCassandraModel
 from cassandra.cqlengine import columns
 import uuid
 from datetime import datetime
+from .format_codec import default_format_encoding, encode_format, decode_format
+from .source_storage import read_source_file
+
+class InvoiceBody(DjangoCassandraModel):
+    # Columns shared by Invoice and the per-supplier / per-organization
+    # listing tables, which hold a full copy of every invoice.
+    __abstract__ = True
 
-class Invoice(DjangoCassandraModel):
-    id = columns.UUID(primary_key=True, default=uuid.uuid4)
-    issuer = columns.UUID(default=uuid.uuid4)
-    recipient = columns.UUID(default=uuid.uuid4)
     source_format = columns.Text()
     internal_format = columns.Text()
-    created_at = columns.DateTime(default=datetime.now)
     archived = columns.Boolean(default=False)
     archived_at = columns.DateTime(default=None, required=False)
     archived_by = columns.Text(required=False)
+    content_hash = columns.Text(required=False)
+    format_encoding = columns.Text(required=False)
+    source_blob = columns.Blob(required=False)
+    internal_blob = columns.Blob(required=False)
+    # Set instead of source_format for documents kept in file storage.
+    source_file = columns.Text(required=False)
+    # Listing projection, filled from the internal format at ingest time.
+    invoice_number = columns.Text(required=False)
+    invoice_date = columns.Text(required=False)
+    due_date = columns.Text(required=False)
+    currency = columns.Text(required=False)
+    total_amount = columns.Double(required=False)
+    # Party snapshot taken at ingest and kept current by
+    # reconcile_party_snapshots, so reads need no MySQL lookup.
+    issuer_name = columns.Text(required=False)
+    supplier_logo_url = columns.Text(required=False)
+    recipient_name = columns.Text(required=False)
+
+    PARTY_SNAPSHOT_FIELDS = ('issuer_name', 'supplier_logo_url', 'recipient_name')
+    FORMAT_FIELDS = ('format_encoding', 'source_format', 'internal_format', 'source_blob', 'internal_blob')
+
+    @classmethod
+    def build(cls, data):
+        data = dict(data)
+        source_format = data.pop('source_format', None)
+        internal_format = data.pop('internal_format', None)
+        invoice = cls(**data)
+        invoice.set_formats(source_format, internal_format)
+        return invoice
+
+    def set_formats(self, source_format, internal_format, encoding=None):
+        # Stores both documents with the given (or configured) encoding and
+        # clears the columns the other encoding uses.
+        encoding = encoding or default_format_encoding()
+        if encoding == 'json':
+            self.format_encoding = None
+            self.source_format, self.internal_format = source_format, internal_format
+            self.source_blob = self.internal_blob = None
+        else:
+            self.format_encoding = encoding
+            self.source_blob = encode_format(source_format, encoding)
+            self.internal_blob = encode_format(internal_format, encoding)
+            self.source_format = self.internal_format = None
+
+    def party_snapshot(self):
+        return {name: getattr(self, name) for name in self.PARTY_SNAPSHOT_FIELDS}
+
+    def get_source_format(self):
+        if self.source_file:
+            return read_source_file(self.source_file)
+        return decode_format(self.format_encoding, self.source_format, self.source_blob)
+
+    def get_internal_format(self):
+        return decode_format(self.format_encoding, self.internal_format, self.internal_blob)
+
+
+class Invoice(InvoiceBody):
+    id = columns.UUID(primary_key=True, default=uuid.uuid4)
+    issuer = columns.UUID(default=uuid.uuid4)
+    recipient = columns.UUID(default=uuid.uuid4)
+    created_at = columns.DateTime(default=datetime.now)
+
+
+class InvoiceBySupplier(InvoiceBody):
+    __table_name__ = 'invoices_by_supplier'
+
+    issuer = columns.UUID(partition_key=True)
+    created_at = columns.DateTime(primary_key=True, clustering_order='DESC')
+    id = columns.UUID(primary_key=True, clustering_order='DESC')
+    recipient = columns.UUID()
+
+
+class InvoiceByOrganization(InvoiceBody):
+    __table_name__ = 'invoices_by_organization'
+
+    recipient = columns.UUID(partition_key=True)
+    created_at = columns.DateTime(primary_key=True, clustering_order='DESC')
+    id = columns.UUID(primary_key=True, clustering_order='DESC')
+    issuer = columns.UUID()
+
+
+class IngestionJob(DjangoCassandraModel):
+    id = columns.UUID(primary_key=True, default=uuid.uuid4)
+    kind = columns.Text()
+    status = columns.Text(default='queued')
+    issuer = columns.UUID()
+    recipient = columns.UUID()
+    file_name = columns.Text()
+    file_path = columns.Text()
+    file_size = columns.BigInt(default=0)
+    created = columns.Integer(default=0)
+    failed = columns.Integer(default=0)
+    duplicates = columns.Integer(default=0)
+    report = columns.Text(required=False)
+    error = columns.Text(required=False)
+    created_at = columns.DateTime(default=datetime.now)
+    started_at = columns.DateTime(required=False)
+    finished_at = columns.DateTime(required=False)
+
+
+class InvoiceFingerprint(DjangoCassandraModel):
+    # content hash -> invoice, so a duplicate check is one partition read.
+    fingerprint = columns.Text(primary_key=True)
+    invoice_id = columns.UUID()
+    created_at = columns.DateTime(default=datetime.now)
 
 
+class IdempotencyKey(DjangoCassandraModel):
+    # Client supplied Idempotency-Key -> the invoice or job it produced.
+    # Keys expire after seven days.
+    __options__ = {'default_time_to_live': 7 * 24 * 60 * 60}
+
+    issuer = columns.UUID(partition_key=True)
+    idempotency_key = columns.Text(primary_key=True)
+    kind = columns.Text()
+    target_id = columns.UUID()
+    created_at = columns.DateTime(default=datetime.now)
@@ -0,0 +1,105 @@
+import csv
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import django
+from .utils import map_csv_rows_to_invoice, group_rows, csv_invoice_key
+
+
+def parallel_map_ordered(func, tasks, workers):
+    # Runs func(*task) in a process pool and yields results in task order.
+    # At most 2 * workers tasks are in flight, so a slow consumer never lets
+    # finished results pile up in memory. Workers are spawned rather than
+    # forked: the parent already runs dispatch and Cassandra driver threads.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(func, *task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _record_key(record, key_index):
+    if key_index is None:
+        return ''
+    fields = next(csv.reader(io.StringIO(record.decode('utf-8'), newline='')), [])
+    return fields[key_index].strip() if key_index < len(fields) else ''
+
+
+def iter_csv_records(csv_file):
+    # Yields (offset, record bytes) for each CSV record. A record spans several
+    # physical lines while a quoted field is open; escaped quotes ("") keep the
+    # quote count even, so an odd running count means the field is still open.
+    offset = csv_file.tell()
+    record, quotes = b'', 0
+    for line in csv_file:
+        record += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield offset, record
+            offset += len(record)
+            record, quotes = b'', 0
+    if record:
+        yield offset, record
+
+
+def split_csv_ranges(path, chunk_bytes, key_column='InvoiceNumber'):
+    # Splits a CSV file into byte ranges of roughly chunk_bytes that start and
+    # end on record boundaries, so quoted fields containing newlines are never
+    # cut. A boundary is only placed between two records with different
+    # key_column values, so consecutive rows of one invoice stay in the same
+    # range.
+    with open(path, 'rb') as csv_file:
+        records = iter_csv_records(csv_file)
+        _, header_record = next(records, (0, b''))
+        header = next(csv.reader(io.StringIO(header_record.decode('utf-8'), newline='')), [])
+        key_index = header.index(key_column) if key_column in header else None
+        ranges = []
+        start, end = len(header_record), len(header_record)
+        previous = None
+        for offset, record in records:
+            end = offset + len(record)
+            if offset - start >= chunk_bytes and previous is not None:
+                record_key = _record_key(record, key_index)
+                if not record_key or record_key != _record_key(previous, key_index):
+                    ranges.append((start, offset))
+                    start = offset
+            previous = record
+        if end > start:
+            ranges.append((start, end))
+    return header, ranges
+
+
+def convert_csv_range(path, header, start, end, organization_id, supplier_id, lookahead):
+    # Worker entry point. Positions are relative to the start of the range.
+    with open(path, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+    rows = list(csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=header))
+    del data
+
+    converted, errors = [], []
+    for position, grouped_rows in group_rows(enumerate(rows), csv_invoice_key, lookahead):
+        try:
+            converted.append((position, map_csv_rows_to_invoice(grouped_rows, organization_id, supplier_id)))
+        except (ValueError, TypeError) as e:
+            errors.append((position, str(e)))
+    return len(rows), converted, errors
+
+
+def convert_csv_file_parallel(path, organization_id, supplier_id, lookahead, workers, chunk_bytes, result):
+    # Yields (row position, invoice_data) in file order, numbering data rows
+    # from 2 like the sequential path.
+    header, ranges = split_csv_ranges(path, chunk_bytes)
+    tasks = ((path, header, start, end, organization_id, supplier_id, lookahead) for start, end in ranges)
+    base = 2
+    for row_count, converted, errors in parallel_map_ordered(convert_csv_range, tasks, workers):
+        for position, error in errors:
+            result.add_error(base + position, error)
+        for position, invoice_data in converted:
+            yield base + position, invoice_data
+        base += row_count
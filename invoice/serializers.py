@@ -1,10 +1,51 @@
 from rest_framework import serializers
 from .models import Invoice
-from authentication.models import Supplier, Organization
+from .listing_utils import create_invoice_with_listings
+from authentication.party_directory import PartyDirectory, party_directory
 from datetime import datetime
 import uuid
+import json
 
-class InvoiceSerializer(serializers.Serializer):
+class PartyListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Invoices written before party snapshots existed fall back to the
+        # directory; resolve all of their parties up front in one pass.
+        data = list(data.all() if hasattr(data, 'all') else data)
+        missing = [obj for obj in data if obj.issuer_name is None or obj.recipient_name is None]
+        party_directory(self.context).prime(
+            supplier_ids={obj.issuer for obj in missing},
+            organization_ids={obj.recipient for obj in missing},
+        )
+        return super().to_representation(data)
+
+
+class InvoicePartySerializer(serializers.Serializer):
+    issuer_name = serializers.SerializerMethodField()
+    recipient_name = serializers.SerializerMethodField()
+    supplier_logo_url = serializers.SerializerMethodField()
+
+    class Meta:
+        list_serializer_class = PartyListSerializer
+
+    # The snapshot columns stored on the invoice win; issuer_name being set
+    # marks a supplier snapshot, whose logo may legitimately be empty.
+    def get_issuer_name(self, obj):
+        if obj.issuer_name is not None:
+            return obj.issuer_name
+        return party_directory(self.context).supplier(obj.issuer).get('name')
+
+    def get_supplier_logo_url(self, obj):
+        if obj.issuer_name is not None:
+            return obj.supplier_logo_url
+        return party_directory(self.context).supplier(obj.issuer).get('logo_url')
+
+    def get_recipient_name(self, obj):
+        if obj.recipient_name is not None:
+            return obj.recipient_name
+        return party_directory(self.context).organization(obj.recipient).get('name')
+
+
+class InvoiceSerializer(InvoicePartySerializer):
     id = serializers.UUIDField(default=uuid.uuid4)
     issuer = serializers.UUIDField(default=uuid.uuid4)
     recipient = serializers.UUIDField(default=uuid.uuid4)
@@ -14,40 +55,93 @@ class InvoiceSerializer(serializers.Serializer):
     archived = serializers.BooleanField(default=False)
     archived_at = serializers.DateTimeField(required=False, allow_null=True)
     archived_by = serializers.CharField(required=False, allow_null=True)
+    content_hash = serializers.CharField(required=False, allow_null=True, write_only=True)
+    invoice_number = serializers.CharField(required=False, allow_null=True)
+    invoice_date = serializers.CharField(required=False, allow_null=True)
+    due_date = serializers.CharField(required=False, allow_null=True)
+    currency = serializers.CharField(required=False, allow_null=True)
+    total_amount = serializers.FloatField(required=False, allow_null=True)
 
-    issuer_name = serializers.SerializerMethodField()
-    recipient_name = serializers.SerializerMethodField()
-    supplier_logo_url = serializers.SerializerMethodField()
+    def validate_internal_format(self, value):
+        # Structured responses splice the stored text in as JSON as-is.
+        try:
+            json.loads(value)
+        except ValueError:
+            raise serializers.ValidationError('internal_format must be a JSON document.')
+        return value
 
     def create(self, validated_data):
-        return Invoice.objects.create(**validated_data)
+        invoice = Invoice.build(validated_data)
+        for name, value in PartyDirectory(cached=False).snapshot(invoice.issuer, invoice.recipient).items():
+            setattr(invoice, name, value)
+        return create_invoice_with_listings(invoice)
 
     def update(self, instance, validated_data):
-        instance.source_format = validated_data.get('source_format', instance.source_format)
-        instance.internal_format = validated_data.get('internal_format', instance.internal_format)
+        instance.set_formats(
+            validated_data.get('source_format', instance.get_source_format()),
+            validated_data.get('internal_format', instance.get_internal_format()),
+        )
         instance.archived = validated_data.get('archived', instance.archived)
         instance.archived_at = validated_data.get('archived_at', instance.archived_at)
         instance.archived_by = validated_data.get('archived_by', instance.archived_by)
         instance.save()
         return instance
 
-    def get_issuer_name(self, obj):
-        try:
-            supplier = Supplier.objects.get(id=obj.issuer)
-            return supplier.user.username
-        except Supplier.DoesNotExist:
-            return None
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['source_format'] = instance.get_source_format()
+        data['internal_format'] = instance.get_internal_format()
+        return data
 
-    def get_supplier_logo_url(self, obj):
-        try:
-            supplier = Supplier.objects.get(id=obj.issuer)
-            return supplier.logo_url
-        except Supplier.DoesNotExist:
-            return None
 
-    def get_recipient_name(self, obj):
-        try:
-            organization = Organization.objects.get(id=obj.recipient)
-            return organization.name
-        except Organization.DoesNotExist:
+class InvoiceSummarySerializer(InvoicePartySerializer):
+    # Listing view: reads only the columns in SUMMARY_COLUMNS.
+    SUMMARY_COLUMNS = (
+        'id', 'issuer', 'recipient', 'created_at', 'archived', 'archived_at',
+        'invoice_number', 'invoice_date', 'due_date', 'currency', 'total_amount',
+        'issuer_name', 'supplier_logo_url', 'recipient_name',
+    )
+
+    id = serializers.UUIDField()
+    issuer = serializers.UUIDField()
+    recipient = serializers.UUIDField()
+    created_at = serializers.DateTimeField()
+    archived = serializers.BooleanField()
+    archived_at = serializers.DateTimeField(allow_null=True)
+    invoice_number = serializers.CharField(allow_null=True)
+    invoice_date = serializers.CharField(allow_null=True)
+    due_date = serializers.CharField(allow_null=True)
+    currency = serializers.CharField(allow_null=True)
+    total_amount = serializers.FloatField(allow_null=True)
+
+
+class IngestionJobSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    kind = serializers.CharField()
+    status = serializers.CharField()
+    file_name = serializers.CharField()
+    file_size = serializers.IntegerField()
+    created = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    duplicates = serializers.IntegerField()
+    error = serializers.CharField(allow_null=True)
+    created_at = serializers.DateTimeField()
+    started_at = serializers.DateTimeField(allow_null=True)
+    finished_at = serializers.DateTimeField(allow_null=True)
+
+    processed = serializers.SerializerMethodField()
+    throughput = serializers.SerializerMethodField()
+    report = serializers.SerializerMethodField()
+
+    def get_processed(self, obj):
+        return (obj.created or 0) + (obj.failed or 0) + (obj.duplicates or 0)
+
+    def get_throughput(self, obj):
+        # Processed entries per second since the job started.
+        if not obj.started_at:
             return None
+        elapsed = ((obj.finished_at or datetime.now()) - obj.started_at).total_seconds()
+        return round(self.get_processed(obj) / elapsed, 2) if elapsed > 0 else None
+
+    def get_report(self, obj):
+        return json.loads(obj.report) if obj.report else None
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from authentication.models import User, Supplier, Organization
+from synth_invo_analyzer.celery import dispatch
+from .tasks import reconcile_party_snapshots_task
+
+# Fields copied into invoice party snapshots (supplier display names are
+# usernames). Reconciling rewrites a whole partition, so it only runs when
+# one of these values actually changed.
+SNAPSHOT_SOURCE_FIELDS = {
+    Supplier: ('logo_url',),
+    Organization: ('name',),
+    User: ('username',),
+}
+
+
+def _reconcile_on_commit(party_type, party_id):
+    transaction.on_commit(lambda: dispatch(reconcile_party_snapshots_task, party_type, str(party_id)))
+
+
+@receiver(pre_save, sender=Supplier)
+@receiver(pre_save, sender=Organization)
+@receiver(pre_save, sender=User)
+def remember_snapshot_fields(sender, instance, update_fields=None, **kwargs):
+    fields = SNAPSHOT_SOURCE_FIELDS[sender]
+    instance._snapshot_fields_before = None
+    if instance._state.adding or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    instance._snapshot_fields_before = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def _snapshot_fields_changed(sender, instance):
+    before = getattr(instance, '_snapshot_fields_before', None)
+    return before is not None and any(before[name] != getattr(instance, name) for name in SNAPSHOT_SOURCE_FIELDS[sender])
+
+
+@receiver(post_save, sender=Supplier)
+def supplier_saved(sender, instance, created, **kwargs):
+    if _snapshot_fields_changed(sender, instance):
+        _reconcile_on_commit('supplier', instance.id)
+
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, created, **kwargs):
+    if _snapshot_fields_changed(sender, instance):
+        _reconcile_on_commit('organization', instance.id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not _snapshot_fields_changed(sender, instance):
+        return
+    for supplier_id in Supplier.objects.filter(user_id=instance.id).values_list('id', flat=True):
+        _reconcile_on_commit('supplier', supplier_id)
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from authentication.party_directory import PartyDirectory
+from search.elasticsearch_utils import update_party_snapshots_index
+from .models import InvoiceBySupplier, InvoiceByOrganization
+from .bulk_actions import KEY_COLUMNS, update_statements
+from .bulk_utils import chunked
+from .cql_utils import execute_concurrent_statements
+from .cache_utils import invoice_cache_key, touch_invoice_lists
+
+
+def reconcile_party_snapshots(party_type, party_id, chunk_size=500):
+    # Rewrites the snapshot columns of every invoice of one supplier or
+    # organization, found through its listing partition, and of its search
+    # documents. party_type is 'supplier' or 'organization'. The values are
+    # read from the database: this runs right after a rename, when cached
+    # copies may still hold the old ones.
+    directory = PartyDirectory(cached=False)
+    if party_type == 'supplier':
+        supplier = directory.supplier(party_id)
+        values = {'issuer_name': supplier.get('name'), 'supplier_logo_url': supplier.get('logo_url')}
+        model, party_field = InvoiceBySupplier, 'issuer'
+    else:
+        values = {'recipient_name': directory.organization(party_id).get('name')}
+        model, party_field = InvoiceByOrganization, 'recipient'
+
+    rewritten = 0
+    rows = model.objects.filter(**{party_field: party_id}).only(list(KEY_COLUMNS))
+    for chunk in chunked(rows, chunk_size):
+        keys = [{name: getattr(row, name) for name in KEY_COLUMNS} for row in chunk]
+        writes = [statement for key in keys for statement in update_statements(key, values)]
+        for success, result in execute_concurrent_statements(writes):
+            if not success:
+                print(f"Error rewriting party snapshot: {result}")
+        cache.delete_many([invoice_cache_key(key['id']) for key in keys])
+        touch_invoice_lists((key['issuer'], key['recipient']) for key in keys)
+        rewritten += len(keys)
+
+    update_party_snapshots_index(party_field, party_id, values)
+    return rewritten
@@ -0,0 +1,39 @@
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Raw documents too large to keep in a Cassandra cell (streamed XML
+# uploads) are kept in default_storage; the invoice stores the path in
+# source_file. Like the ingestion uploads, this must be shared storage when
+# workers run on several hosts.
+
+_XML_DECLARATION = re.compile(rb'^<\?xml[^>]*\bencoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+
+def store_source_file(invoice_id, name, source_file):
+    # Copied chunk by chunk by the storage backend.
+    source_dir = getattr(settings, 'INVOICE_SOURCE_DIR', 'invoice-sources')
+    source_file.seek(0)
+    return default_storage.save(f'{source_dir}/{invoice_id}/{name}', source_file)
+
+
+def xml_encoding(head):
+    # Encoding of an XML document from its BOM or declaration.
+    if head.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if head.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return 'utf-16'
+    match = _XML_DECLARATION.match(head)
+    return match.group(1).decode('ascii') if match else 'utf-8'
+
+
+def read_source_file(path):
+    with default_storage.open(path, 'rb') as source_file:
+        content = source_file.read()
+    return content.decode(xml_encoding(content[:256]))
+
+
+def delete_source_files(paths):
+    for path in paths:
+        if path:
+            default_storage.delete(path)
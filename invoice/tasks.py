@@ -0,0 +1,19 @@
+from celery import shared_task
+from search.elasticsearch_utils import build_invoice_document
+from .jobs import process_ingestion_job
+from .snapshot_utils import reconcile_party_snapshots
+
+
+@shared_task(acks_late=True)
+def run_ingestion_job(job_id):
+    process_ingestion_job(job_id)
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def index_invoice_task(invoice_json, supplier_id, organization_id, invoice_id, parties=None):
+    build_invoice_document(invoice_json, supplier_id, organization_id, invoice_id, parties).save()
+
+
+@shared_task(acks_late=True)
+def reconcile_party_snapshots_task(party_type, party_id):
+    reconcile_party_snapshots(party_type, party_id)
@@ -4,9 +4,15 @@ from . import views
 urlpatterns = [
     path('create_invoice/', views.create_invoice, name='create-invoice'), 
     path('bulk-upload-invoices/', views.bulk_upload_invoices, name='bulk_upload_invoices'),
+    path('bulk-create-invoices/', views.bulk_create_invoices, name='bulk_create_invoices'),
+    path('ingestion-jobs/<uuid:job_id>/', views.ingestion_job_status, name='ingestion-job-status'),
     path('get-invoice-by-supplier/', views.supplier_invoice_view, name = 'get-invoice-by-supplier'), 
     path('get-invoice-by-organization/', views.organization_invoice_view, name = 'get-invoice-by-organization'),
+    path('<uuid:invoice_id>/<uuid:user_id>/', views.get_invoice, name='get-invoice'),
     path('archive-invoice/<uuid:invoice_id>/<uuid:user_id>/', views.archive_invoice, name= 'archive-invoice'),
+    path('bulk-archive-invoices/<uuid:user_id>/', views.bulk_archive_invoices, name='bulk-archive-invoices'),
+    path('bulk-restore-invoices/<uuid:user_id>/', views.bulk_restore_invoices, name='bulk-restore-invoices'),
+    path('bulk-delete-invoices/', views.bulk_delete_invoices, name='bulk-delete-invoices'),
     path('archived-invoices/<uuid:user_id>/', views.view_archived_invoices, name='view-archived-invoices'),
     path('restore-invoice/<uuid:invoice_id>/<uuid:user_id>/', views.restore_invoice, name='restore-invoices'),
     path('delete-invoice/<uuid:invoice_id>/<uuid:user_id>/', views.delete_invoice, name='delete-invoices'),
@@ -1,106 +1,44 @@
-from invoice_template.models import Template
+from .mapping_utils import get_mapping_plan
 import json
+from .dedup_utils import invoice_fingerprint, converted_invoice_number
+from collections import OrderedDict
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
-def clean_number_string(number_str: str) -> str:
-    return number_str.replace('$', '').replace(',', '').strip()
-
-def map_field(data, mapping, data_type=None):
-    if isinstance(mapping, float) or isinstance(mapping, int):
-        return mapping
-    keys = mapping.split('.')
-    current_value = data
-    for key in keys:
-        current_value = current_value.get(key, '')
-    
-  
-    if isinstance(current_value, str):
-        current_value = clean_number_string(current_value)
-    
-    if data_type == 'int':
-        return int(current_value) if current_value else 0
-    elif data_type == 'float':
-        return float(current_value) if current_value else 0.0
-    return current_value
-
 def format_invoice(invoice, supplier_id):
-    template_mapping = Template.objects.get(supplier=supplier_id)
-   
-    mapping = json.loads(template_mapping.mapping)
-   
-   
-    formatted_invoice = {
-        "invoice": {
-            "header": {
-                "invoice_number": map_field(invoice, mapping.get("invoice_number", "")),
-                "invoice_date": map_field(invoice, mapping.get("invoice_date", "")),
-                "due_date": map_field(invoice, mapping.get("due_date", "")),
-                "currency": map_field(invoice, mapping.get("currency", ""))
-            },
-            "seller": {
-                "company_name": map_field(invoice, mapping.get("seller.company_name", "")),
-                "address": {
-                    "street": map_field(invoice, mapping.get("seller.address.street", "")),
-                    "city": map_field(invoice, mapping.get("seller.address.city", "")),
-                    "state": map_field(invoice, mapping.get("seller.address.state", "")),
-                    "zip_code": map_field(invoice, mapping.get("seller.address.zip_code", "")),
-                    "country": map_field(invoice, mapping.get("seller.address.country", ""))
-                },
-                "contact": {
-                    "name": map_field(invoice, mapping.get("seller.contact.name", "")),
-                    "phone": map_field(invoice, mapping.get("seller.contact.phone", "")),
-                    "email": map_field(invoice, mapping.get("seller.contact.email", ""))
-                }
-            },
-            "buyer": {
-                "company_name": map_field(invoice, mapping.get("buyer.company_name", "")),
-                "address": {
-                    "street": map_field(invoice, mapping.get("buyer.address.street", "")),
-                    "city": map_field(invoice, mapping.get("buyer.address.city", "")),
-                    "state": map_field(invoice, mapping.get("buyer.address.state", "")),
-                    "zip_code": map_field(invoice, mapping.get("buyer.address.zip_code", "")),
-                    "country": map_field(invoice, mapping.get("buyer.address.country", ""))
-                },
-                "contact": {
-                    "name": map_field(invoice, mapping.get("buyer.contact.name", "")),
-                    "phone": map_field(invoice, mapping.get("buyer.contact.phone", "")),
-                    "email": map_field(invoice, mapping.get("buyer.contact.email", ""))
-                }
-            },
-            "items": [
-                {
-                    "description": map_field(item, mapping["items.list"][1]["description"]),
-                    "quantity": map_field(item, mapping["items.list"][1]["quantity"], 'int'),
-                    "unit_price": map_field(item, mapping["items.list"][1]["unit_price"], 'float'),
-                    "total_price": map_field(item, mapping["items.list"][1]["total_price"], 'float')
-                } for item in map_field(invoice, mapping["items.list"][0])
-            ],
-            "summary": {
-                "subtotal": map_field(invoice, mapping.get("summary.subtotal", 0.0), 'float'),
-                "tax_rate": map_field(invoice, mapping.get("summary.tax_rate", 0.0), 'float'),
-                "tax_amount": map_field(invoice, mapping.get("summary.tax_amount", 0.0), 'float'),
-                "total_amount": map_field(invoice, mapping.get("summary.total_amount", 0.0), 'float'),
-                "discount": map_field(invoice, mapping.get("summary.discount", 0.0), 'float')
-            },
-            "payment_instructions": {
-                "bank_name": map_field(invoice, mapping.get("payment_instructions.bank_name", "")),
-                "account_number": map_field(invoice, mapping.get("payment_instructions.account_number", "")),
-                "routing_number": map_field(invoice, mapping.get("payment_instructions.routing_number", "")),
-                "swift": map_field(invoice, mapping.get("payment_instructions.swift", ""))
-            },
-            "notes": {
-                "note": map_field(invoice, mapping.get("notes.note", ""))
-            }
-        }
+    return get_mapping_plan(supplier_id).extract(invoice)
+
+def invoice_summary(converted_invoice):
+    # Columns stored next to the documents so listings can skip them.
+    invoice = converted_invoice.get('invoice', {})
+    header = invoice.get('header', {})
+    total_amount = invoice.get('summary', {}).get('total_amount')
+    try:
+        total_amount = float(total_amount)
+    except (TypeError, ValueError):
+        total_amount = None
+    return {
+        'invoice_number': str(header.get('invoice_number') or '') or None,
+        'invoice_date': str(header.get('invoice_date') or '') or None,
+        'due_date': str(header.get('due_date') or '') or None,
+        'currency': str(header.get('currency') or '') or None,
+        'total_amount': total_amount,
     }
-    
 
-    return formatted_invoice
+def map_csv_item(row):
+    return {
+        "description": row.get('ItemDescription') or 'N/A',
+        "quantity": int(row.get('ItemQuantity', '0') or '0'),
+        "unit_price": float(row.get('ItemUnitPrice', '0.0') or '0.0'),
+        "total_price": float(row.get('ItemTotalPrice', '0.0') or '0.0')
+    }
 
-def map_csv_row_to_invoice(row, organization_id, supplier_id):
+def convert_csv_rows(rows):
+    # Header, party and summary columns come from the first row; every row
+    # contributes one line item.
+    row = rows[0]
     converted_invoice = {
         "invoice": {
             "header": {
@@ -139,14 +77,7 @@ def map_csv_row_to_invoice(row, organization_id, supplier_id):
                     "email": row.get('BuyerContactEmail') or 'N/A'
                 }
             },
-            "items": [
-                {
-                    "description": row.get('ItemDescription') or 'N/A',
-                    "quantity": int(row.get('ItemQuantity', '0') or '0'),
-                    "unit_price": float(row.get('ItemUnitPrice', '0.0') or '0.0'),
-                    "total_price": float(row.get('ItemTotalPrice', '0.0') or '0.0')
-                }
-            ],
+            "items": [map_csv_item(item_row) for item_row in rows],
             "summary": {
                 "subtotal": float(row.get('InvoiceSubtotal', '0.0') or '0.0'),
                 "tax_rate": float(row.get('InvoiceTaxRate', '0.0') or '0.0'),
@@ -165,16 +96,48 @@ def map_csv_row_to_invoice(row, organization_id, supplier_id):
             }
         }
     }
+    return converted_invoice
 
+def group_rows(rows, key, lookahead):
+    # Yields (position of first row, [rows]) with rows sharing a key merged.
+    # At most `lookahead` groups are kept open; when another one is needed the
+    # oldest is emitted, so rows of one invoice only merge if they are no more
+    # than `lookahead` distinct invoices apart. Rows without a key, or a
+    # lookahead of 0, are never merged.
+    open_groups = OrderedDict()
+    for position, row in rows:
+        group_key = key(row)
+        if not group_key or lookahead <= 0:
+            yield position, [row]
+            continue
+        if group_key in open_groups:
+            open_groups[group_key][1].append(row)
+            continue
+        if len(open_groups) >= lookahead:
+            yield open_groups.popitem(last=False)[1]
+        open_groups[group_key] = (position, [row])
+    while open_groups:
+        yield open_groups.popitem(last=False)[1]
+
+def csv_invoice_key(row):
+    return (row.get('InvoiceNumber') or '').strip()
+
+def map_csv_rows_to_invoice(rows, organization_id, supplier_id):
+    source_invoice = rows[0] if len(rows) == 1 else rows
+    converted_invoice = convert_csv_rows(rows)
     invoice_data = {
         'issuer': supplier_id,
         'recipient': organization_id,
-        'source_format': json.dumps(row),
+        'source_format': json.dumps(source_invoice),
         'internal_format': json.dumps(converted_invoice),
+        'content_hash': invoice_fingerprint(supplier_id, converted_invoice_number(converted_invoice), source_invoice),
+        **invoice_summary(converted_invoice),
     }
-    print(converted_invoice)
     return invoice_data
 
+def map_csv_row_to_invoice(row, organization_id, supplier_id):
+    return map_csv_rows_to_invoice([row], organization_id, supplier_id)
+
 def convert_date_format(date_str):
     try:
         return datetime.strptime(date_str, "%m/%d/%Y").strftime("%Y-%m-%d")
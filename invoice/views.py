@@ -1,28 +1,130 @@
+import uuid
 from uuid import UUID
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 import json
 import xmltodict
-from .models import Invoice
-from .utils import format_invoice, map_csv_row_to_invoice
-from .serializers import InvoiceSerializer
+from .models import Invoice, InvoiceBySupplier, InvoiceByOrganization, IngestionJob
+from .listing_utils import save_archive_state, delete_invoice_with_listings
+from .cql_utils import fetch_page, iter_pages
+from .cache_utils import get_cached_invoice, invoice_list_scope
+from .bulk_actions import load_invoice_keys, find_invoice_keys, apply_invoice_action
+from django.core import signing
+from .utils import format_invoice, invoice_summary
+from .jobs import create_ingestion_job
+from .dedup_utils import (
+    invoice_fingerprint, converted_invoice_number, claim_fingerprint, forget_fingerprint,
+    claim_idempotency_key, record_idempotency_key, release_idempotency_key,
+)
+from .tasks import run_ingestion_job, index_invoice_task
+from .serializers import InvoiceSerializer, InvoiceSummarySerializer, IngestionJobSerializer
 from rest_framework import status
-from search.elasticsearch_utils import async_index_invoices, delete_invoice_index
-import threading
-import csv
-import io
+from search.elasticsearch_utils import delete_invoice_index
+from synth_invo_analyzer.celery import dispatch
+from synth_invo_analyzer.streaming import stream_format, streaming_json_response
+from synth_invo_analyzer.raw_json import dumps, embed
+from synth_invo_analyzer.versioning import conditional_response
+from django.http import HttpResponse
 from authentication.permissions import IsOrganization, IsSystemAdmin, IsSupplier
 from datetime import datetime, timedelta
 from django.db.models import Q
+from django.conf import settings
 
 
 
 
+def queue_ingestion(request, kind, uploaded_file, organization_id, supplier_id):
+    # Repeating a request with the same Idempotency-Key returns the job the
+    # first one created instead of ingesting the file again. The key is
+    # claimed before the job is created, so concurrent repeats cannot both
+    # create one.
+    idempotency_key = request.headers.get('Idempotency-Key')
+    job_id = uuid.uuid4()
+    claimed = claim_idempotency_key(supplier_id, idempotency_key, 'job', job_id)
+    if claimed:
+        claimed_kind, target_id = claimed
+        job = IngestionJob.objects.filter(id=target_id).first() if claimed_kind == 'job' else None
+        if job is None:
+            return idempotency_conflict_response(claimed_kind, 'job')
+        return Response({'success': 'Upload already accepted.', 'job_id': str(job.id), 'status': job.status}, status=status.HTTP_200_OK)
+
+    try:
+        job = create_ingestion_job(kind, uploaded_file, organization_id, supplier_id, job_id)
+    except Exception:
+        release_idempotency_key(supplier_id, idempotency_key)
+        raise
+    dispatch(run_ingestion_job, str(job.id))
+    return Response({'success': 'Upload accepted for processing.', 'job_id': str(job.id), 'status': job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+def idempotency_conflict_response(claimed_kind, kind):
+    # The key belongs to another kind of request, or the request that
+    # claimed it has not stored its result yet.
+    if claimed_kind != kind:
+        return Response({'error': 'Idempotency-Key was already used for another request.'}, status=status.HTTP_409_CONFLICT)
+    return Response({'error': 'A request with this Idempotency-Key is still in progress.'}, status=status.HTTP_409_CONFLICT)
+
+
+def existing_invoice_response(invoice_id):
+    invoice = Invoice.objects.filter(id=invoice_id).first()
+    if invoice is None:
+        return idempotency_conflict_response('invoice', 'invoice')
+    serializer = InvoiceSerializer(invoice)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def structured_response(request):
+    # ?structured=true returns internal_format as an embedded JSON object
+    # spliced in from the stored text instead of a JSON-encoded string.
+    return request.query_params.get('structured') in ('1', 'true')
+
+
+def invoice_json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(dumps(data), content_type='application/json', status=status_code)
+
+
+def invoice_page_response(request, model, filters, allow_filtering=False):
+    # ?limit= sets the page size (capped at INVOICE_LIST_MAX_PAGE_SIZE) and
+    # ?cursor= takes the next_cursor of the previous page. ?view=summary
+    # returns InvoiceSummarySerializer rows without reading the documents.
+    # ?stream=json|ndjson streams all matching invoices instead of one page.
+    try:
+        limit = int(request.query_params.get('limit') or settings.INVOICE_LIST_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.INVOICE_LIST_MAX_PAGE_SIZE))
+
+    summary = request.query_params.get('view') == 'summary'
+    columns = InvoiceSummarySerializer.SUMMARY_COLUMNS if summary else None
+    serializer_class = InvoiceSummarySerializer if summary else InvoiceSerializer
+    embedded = () if summary or not structured_response(request) else ('internal_format',)
+
+    format = stream_format(request)
+    if format:
+        # Streams every matching invoice, serialized one page at a time.
+        pages = iter_pages(model, filters, limit, allow_filtering, columns)
+        invoices = (embed(item, embedded) for page in pages for item in serializer_class(page, many=True).data)
+        return streaming_json_response(invoices, format, envelope='invoices')
+
+    try:
+        invoices, next_cursor = fetch_page(model, filters, limit, request.query_params.get('cursor'), allow_filtering, columns)
+    except signing.BadSignature:
+        return Response({'error': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = serializer_class(invoices, many=True)
+    if embedded:
+        return invoice_json_response({'invoices': [embed(item, embedded) for item in serializer.data], 'next_cursor': next_cursor})
+    return Response({'invoices': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsSupplier])
 def create_invoice(request):
     try:
         source_invoice = request.data.get('source_invoice')
+        supplier_id = request.data.get("supplier_id")
+        organization_id = request.data.get("organization_id")
+        idempotency_key = request.headers.get('Idempotency-Key')
         
         if isinstance(source_invoice, str):
             if source_invoice.strip().startswith('<'):
@@ -32,36 +134,64 @@ def create_invoice(request):
         
         elif 'source_invoice' in request.FILES:
             source_invoice_file = request.FILES['source_invoice']
-            if source_invoice_file.name.endswith('.xml'):
+            if source_invoice_file.name.endswith('.xml') and source_invoice_file.size >= settings.XML_STREAMING_MIN_BYTES:
+                # Large documents are parsed item by item in an ingestion job.
+                return queue_ingestion(request, 'xml', source_invoice_file, organization_id, supplier_id)
+            elif source_invoice_file.name.endswith('.xml'):
                 source_invoice = xmltodict.parse(source_invoice_file.read())
             else:
                 source_invoice = json.load(source_invoice_file)
 
-        supplier_id = request.data.get("supplier_id")
-        organization_id = request.data.get("organization_id")
+        # The Idempotency-Key and then the content fingerprint are claimed
+        # before the invoice is written, so a client re-POSTing while its
+        # first request is still running cannot create a second invoice.
+        invoice_id = uuid.uuid4()
+        claimed = claim_idempotency_key(supplier_id, idempotency_key, 'invoice', invoice_id)
+        if claimed:
+            claimed_kind, target_id = claimed
+            if claimed_kind != 'invoice':
+                return idempotency_conflict_response(claimed_kind, 'invoice')
+            return existing_invoice_response(target_id)
 
-        converted_invoice = format_invoice(source_invoice, supplier_id)
-        
-        
-        invoice_data = {
-            'issuer': supplier_id,
-            'recipient': organization_id,
-            'source_format': json.dumps(source_invoice),  
-            'internal_format': json.dumps(converted_invoice),
-        }
-
-        serializer = InvoiceSerializer(data=invoice_data)
-        
-        if serializer.is_valid():
+        claimed_hash = None
+        try:
+            converted_invoice = format_invoice(source_invoice, supplier_id)
+
+            # A re-submitted invoice returns the stored one instead of a copy.
+            content_hash = invoice_fingerprint(supplier_id, converted_invoice_number(converted_invoice), source_invoice)
+            existing_invoice_id = claim_fingerprint(content_hash, invoice_id)
+            if existing_invoice_id:
+                record_idempotency_key(supplier_id, idempotency_key, 'invoice', existing_invoice_id)
+                return existing_invoice_response(existing_invoice_id)
+            claimed_hash = content_hash
+
+            invoice_data = {
+                'id': invoice_id,
+                'issuer': supplier_id,
+                'recipient': organization_id,
+                'source_format': json.dumps(source_invoice),  
+                'internal_format': json.dumps(converted_invoice),
+                'content_hash': content_hash,
+                **invoice_summary(converted_invoice),
+            }
+
+            serializer = InvoiceSerializer(data=invoice_data)
             
+            if not serializer.is_valid():
+                print(serializer.errors)
+                forget_fingerprint(claimed_hash)
+                release_idempotency_key(supplier_id, idempotency_key)
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
             invoice = serializer.save()
+        except Exception:
+            forget_fingerprint(claimed_hash)
+            release_idempotency_key(supplier_id, idempotency_key)
+            raise
          
-            threading.Thread(target=async_index_invoices, args=([json.dumps(converted_invoice)], supplier_id, organization_id, invoice.id)).start()
-            
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            print(serializer.errors)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        dispatch(index_invoice_task, json.dumps(converted_invoice), str(supplier_id), str(organization_id), str(invoice.id), invoice.party_snapshot())
+        
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     except Exception as e:
         print(e)
@@ -78,23 +208,42 @@ def bulk_upload_invoices(request):
         if not csv_file.name.endswith('.csv'):
             return Response({'error': 'Invalid file format. Please upload a CSV file.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        csv_data = csv_file.read().decode('utf-8')
-        reader = csv.DictReader(io.StringIO(csv_data))
-        
-        invoices = []
-        for row in reader:
-            invoice_data = map_csv_row_to_invoice(row, organization_id, supplier_id)
-            serializer = InvoiceSerializer(data=invoice_data)
-            if serializer.is_valid():
-                invoice = serializer.save()
-                invoices.append(invoice)
-                threading.Thread(target=async_index_invoices, args=([(invoice_data['internal_format'])], invoice.issuer, invoice.recipient, invoice.id)).start()
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return queue_ingestion(request, 'csv', csv_file, organization_id, supplier_id)
 
-        return Response({'success': f'{len(invoices)} invoices uploaded successfully.'}, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsSupplier])
+def bulk_create_invoices(request):
+    try:
+        supplier_id = request.data.get("supplier_id")
+        organization_id = request.data.get("organization_id")
+        source_file = request.FILES.get('source_invoices')
+
+        if not source_file or not source_file.name.lower().endswith(('.zip', '.ndjson', '.jsonl')):
+            return Response({'error': 'Invalid file format. Please upload a .zip, .ndjson or .jsonl file.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return queue_ingestion(request, 'documents', source_file, organization_id, supplier_id)
 
     except Exception as e:
+        print(e)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+@api_view(['GET'])
+@permission_classes([IsSupplier])
+def ingestion_job_status(request, job_id):
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+        serializer = IngestionJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    except IngestionJob.DoesNotExist:
+        return Response({'error': 'Ingestion job not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        print(e)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     
@@ -105,10 +254,10 @@ def supplier_invoice_view(request):
     try:
         supplier_id = request.query_params.get('supplier_id')
         
-        invoices = Invoice.objects.filter(issuer=supplier_id)
-        serializer = InvoiceSerializer(invoices, many=True)
-        
-        return Response({'invoices': serializer.data}, status=status.HTTP_200_OK)
+        return conditional_response(
+            request, [invoice_list_scope('supplier', supplier_id)],
+            lambda: invoice_page_response(request, InvoiceBySupplier, {'issuer': supplier_id}),
+        )
     except Exception as e:
         print(e)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -120,14 +269,32 @@ def organization_invoice_view(request):
     try:
         organization_id = request.query_params.get('orgId')
         
-        invoices = Invoice.objects.filter(recipient=organization_id)
-        serializer = InvoiceSerializer(invoices, many=True)
-        
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_response(
+            request, [invoice_list_scope('organization', organization_id)],
+            lambda: invoice_page_response(request, InvoiceByOrganization, {'recipient': organization_id}),
+        )
     except Exception as e:
         print(e)
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+@api_view(['GET'])
+@permission_classes([IsOrganization | IsSupplier])
+def get_invoice(request, invoice_id, user_id):
+    try:
+        data = get_cached_invoice(invoice_id, lambda: InvoiceSerializer(Invoice.objects.get(id=invoice_id)).data)
+
+        if str(user_id) not in [str(data['recipient']), str(data['issuer'])]:
+            return Response({'error': 'You do not have permission to view this invoice.'}, status=status.HTTP_403_FORBIDDEN)
+
+        if structured_response(request):
+            return invoice_json_response(embed(data, ('internal_format',)))
+        return Response(data, status=status.HTTP_200_OK)
+    except Invoice.DoesNotExist:
+        return Response({'error': 'Invoice not found.'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        print(e)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
 @api_view(['PUT'])
 @permission_classes([IsOrganization | IsSupplier])
 def archive_invoice(request, invoice_id, user_id):
@@ -141,7 +308,7 @@ def archive_invoice(request, invoice_id, user_id):
         invoice.archived = True
         invoice.archived_at = datetime.now()
         invoice.archived_by = str(user_id)
-        invoice.save()
+        save_archive_state(invoice)
 
         serializer = InvoiceSerializer(invoice)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -163,7 +330,7 @@ def restore_invoice(request, invoice_id, user_id):
         invoice.archived = False
         invoice.archived_at = None
         invoice.archived_by = None
-        invoice.save()
+        save_archive_state(invoice)
 
         serializer = InvoiceSerializer(invoice)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -177,7 +344,8 @@ def restore_invoice(request, invoice_id, user_id):
 def delete_invoice(request, invoice_id):
     try:
         invoice = Invoice.objects.get(id=invoice_id)
-        invoice.delete()
+        delete_invoice_with_listings(invoice)
+        forget_fingerprint(invoice.content_hash)
         delete_invoice_index(invoice_id)
         return Response({'success': 'Invoice deleted successfully.'}, status=status.HTTP_200_OK)
     except Invoice.DoesNotExist:
@@ -189,10 +357,61 @@ def delete_invoice(request, invoice_id):
 @permission_classes([IsOrganization | IsSupplier])
 def view_archived_invoices(request, user_id):
     try:
-        recipient_invoices = Invoice.objects.filter(archived=True, recipient=user_id)
-        
-        serializer = InvoiceSerializer(recipient_invoices, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Filtering on archived stays inside the recipient's partition.
+        return invoice_page_response(
+            request, InvoiceByOrganization, {'recipient': user_id, 'archived': True}, allow_filtering=True,
+        )
     except Exception as e:
         print(e)
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+def bulk_invoice_action(request, action, user_id=None):
+    # Body: {"invoice_ids": [...]} or {"filters": {"user_id", "counterparty",
+    # "date_from", "date_to"}} (dates are ISO 8601, created_at in [from, to)).
+    invoice_ids = request.data.get('invoice_ids')
+    filters = request.data.get('filters')
+    if invoice_ids:
+        keys = load_invoice_keys([UUID(str(invoice_id)) for invoice_id in invoice_ids])
+    elif filters:
+        owner_id = user_id or filters.get('user_id')
+        if not owner_id:
+            return Response({'error': 'filters require a user_id.'}, status=status.HTTP_400_BAD_REQUEST)
+        keys = find_invoice_keys(
+            UUID(str(owner_id)),
+            counterparty=UUID(str(filters['counterparty'])) if filters.get('counterparty') else None,
+            date_from=datetime.fromisoformat(filters['date_from']) if filters.get('date_from') else None,
+            date_to=datetime.fromisoformat(filters['date_to']) if filters.get('date_to') else None,
+        )
+    else:
+        return Response({'error': 'Provide invoice_ids or filters.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = apply_invoice_action(action, keys, user_id)
+    succeeded = sum(1 for result in results if result['status'] == f'{action}d')
+    return Response({'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}, status=status.HTTP_200_OK)
+
+@api_view(['PUT'])
+@permission_classes([IsOrganization | IsSupplier])
+def bulk_archive_invoices(request, user_id):
+    try:
+        return bulk_invoice_action(request, 'archive', user_id)
+    except Exception as e:
+        print(e)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([IsOrganization | IsSupplier])
+def bulk_restore_invoices(request, user_id):
+    try:
+        return bulk_invoice_action(request, 'restore', user_id)
+    except Exception as e:
+        print(e)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['DELETE'])
+@permission_classes([IsSystemAdmin])
+def bulk_delete_invoices(request):
+    try:
+        return bulk_invoice_action(request, 'delete')
+    except Exception as e:
+        print(e)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,88 @@
+from lxml import etree
+
+
+def _name(node):
+    local_name = etree.QName(node).localname
+    return f'{node.prefix}:{local_name}' if node.prefix else local_name
+
+
+def element_to_dict(element):
+    # Mirrors xmltodict.parse defaults for one element: '@' attributes,
+    # repeated children as lists, '#text' for mixed content, None when empty.
+    result = {}
+    parent = element.getparent()
+    parent_nsmap = parent.nsmap if parent is not None else {}
+    for prefix, uri in element.nsmap.items():
+        if parent_nsmap.get(prefix) != uri:
+            result['@xmlns' + (f':{prefix}' if prefix else '')] = uri
+    for name, value in element.attrib.items():
+        result['@' + _qualified_attribute(element, name)] = value
+
+    text = element.text or ''
+    for child in element:
+        text += child.tail or ''
+        if not isinstance(child.tag, str):
+            continue
+        key = _name(child)
+        value = element_to_dict(child)
+        if key not in result:
+            result[key] = value
+        elif isinstance(result[key], list):
+            result[key].append(value)
+        else:
+            result[key] = [result[key], value]
+
+    text = text.strip()
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+    return result
+
+
+def _qualified_attribute(element, name):
+    qname = etree.QName(name)
+    if not qname.namespace:
+        return name
+    for prefix, uri in element.nsmap.items():
+        if prefix and uri == qname.namespace:
+            return f'{prefix}:{qname.localname}'
+    return qname.localname
+
+
+def stream_format_invoice(source, plan):
+    # Parses an XML invoice incrementally. Elements on the plan's item path
+    # are mapped as soon as they are complete and then removed from the tree,
+    # so memory grows with the size of one item, not with the item count. The
+    # rest of the document is mapped once parsing finishes.
+    items_path = plan.items_path
+    if not isinstance(items_path, tuple):
+        raise ValueError('Template mapping has no item path to stream')
+
+    items = []
+    path = []
+    root = None
+    for event, element in etree.iterparse(source, events=('start', 'end'), remove_comments=True, resolve_entities=False, huge_tree=True):
+        if event == 'start':
+            path.append(_name(element))
+            continue
+        if tuple(path) == items_path:
+            items.append(plan.extract_item(element_to_dict(element)))
+            element.getparent().remove(element)
+        path.pop()
+        root = element
+
+    if root is None:
+        raise ValueError('Empty XML document')
+
+    document = {_name(root): element_to_dict(root)}
+    target = document
+    for key in items_path[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    target[items_path[-1]] = []
+
+    converted_invoice = plan.extract(document)
+    converted_invoice['invoice']['items'] = items
+    return converted_invoice
@@ -0,0 +1,11 @@
+from uuid import UUID
+from synth_invo_analyzer.versioning import bump_versions
+
+
+def template_scope(supplier_id):
+    # Normalized like invoice_list_scope, so readers and writers agree.
+    return f'template:supplier:{UUID(str(supplier_id))}'
+
+
+def touch_supplier_template(supplier_id):
+    bump_versions([template_scope(supplier_id)])
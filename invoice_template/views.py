@@ -7,6 +7,9 @@ from rest_framework import status
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import json
 from authentication.permissions import IsSystemAdmin, IsOrganization, IsSupplier
+from invoice.mapping_utils import invalidate_mapping_plan
+from synth_invo_analyzer.versioning import conditional_response
+from .utils import template_scope, touch_supplier_template
 
 
 @api_view(['POST'])
@@ -35,6 +38,7 @@ def save_invoice_template(request):
     serializer = TemplateSerializer(data=serializer_data)
     if serializer.is_valid():
         serializer.save()
+        touch_supplier_template(supplier)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -66,6 +70,8 @@ def update_mapping(request):
     template.mapped_status = True
     template.mapped_by = admin_id
     template.save()
+    invalidate_mapping_plan(template.supplier, template.mapping)
+    touch_supplier_template(template.supplier)
     
     serializer = TemplateSerializer(template)
     return Response(serializer.data, status= status.HTTP_200_OK)
@@ -88,12 +94,15 @@ def get_supplier_template(request):
         if not supplier_id:
             return Response({'error': 'supplier_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        template = Template.objects.filter(supplier=supplier_id)
-        
-        if not template.exists():
-            return Response({'error': 'Template not found for the given supplier_id'}, status=status.HTTP_404_NOT_FOUND)
-        
-        serializer = TemplateSerializer(template, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build():
+            template = Template.objects.filter(supplier=supplier_id)
+            
+            if not template.exists():
+                return Response({'error': 'Template not found for the given supplier_id'}, status=status.HTTP_404_NOT_FOUND)
+            
+            serializer = TemplateSerializer(template, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return conditional_response(request, [template_scope(supplier_id)], build)
    except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,4 +1,4 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
 from elasticsearch_dsl import Document, Date, Integer, Keyword, Text, Float, Nested, InnerDoc
 from datetime import datetime
 import json
@@ -60,6 +60,9 @@ class InvoiceDocument(Document):
     payment_instructions = Nested(PaymentInstructionsDocument)
     notes = Nested(NotesDocument)
     original_invoice_id = Keyword()  # Add this field
+    issuer_name = Text(fields={'raw': Keyword()})
+    supplier_logo_url = Keyword(index=False)
+    recipient_name = Text(fields={'raw': Keyword()})
 
     class Index:
         name = 'invoices'
@@ -67,82 +70,87 @@ class InvoiceDocument(Document):
 # Ensure the index is created
 InvoiceDocument.init()
 
-def index_invoice(invoice_json, supplier_id, organization_id, original_invoice_id):
-    try:
-        # Parse the JSON invoice to extract relevant fields
-        invoice = json.loads(invoice_json)
-
-        # Extract and convert dates
-        invoice_date = datetime.strptime(invoice["invoice"]["header"]["invoice_date"], "%Y-%m-%d")
-        due_date = datetime.strptime(invoice["invoice"]["header"]["due_date"], "%Y-%m-%d")
-
-        # Prepare the document
-        doc = InvoiceDocument(
-            invoice_number=invoice["invoice"]["header"]["invoice_number"],
-            invoice_date=invoice_date,
-            due_date=due_date,
-            currency=invoice["invoice"]["header"]["currency"],
-            issuer=supplier_id,
-            recipient=organization_id,
-            seller=CompanyDocument(
-                company_name=invoice["invoice"]["seller"]["company_name"],
-                address=AddressDocument(
-                    street=invoice["invoice"]["seller"]["address"]["street"],
-                    city=invoice["invoice"]["seller"]["address"]["city"],
-                    state=invoice["invoice"]["seller"]["address"]["state"],
-                    zip_code=invoice["invoice"]["seller"]["address"]["zip_code"],
-                    country=invoice["invoice"]["seller"]["address"]["country"]
-                ),
-                contact=ContactDocument(
-                    name=invoice["invoice"]["seller"]["contact"]["name"],
-                    phone=invoice["invoice"]["seller"]["contact"]["phone"],
-                    email=invoice["invoice"]["seller"]["contact"]["email"]
-                )
-            ),
-            buyer=CompanyDocument(
-                company_name=invoice["invoice"]["buyer"]["company_name"],
-                address=AddressDocument(
-                    street=invoice["invoice"]["buyer"]["address"]["street"],
-                    city=invoice["invoice"]["buyer"]["address"]["city"],
-                    state=invoice["invoice"]["buyer"]["address"]["state"],
-                    zip_code=invoice["invoice"]["buyer"]["address"]["zip_code"],
-                    country=invoice["invoice"]["buyer"]["address"]["country"]
-                ),
-                contact=ContactDocument(
-                    name=invoice["invoice"]["buyer"]["contact"]["name"],
-                    phone=invoice["invoice"]["buyer"]["contact"]["phone"],
-                    email=invoice["invoice"]["buyer"]["contact"]["email"]
-                )
-            ),
-            items=[
-                ItemDocument(
-                    description=item["description"],
-                    quantity=item["quantity"],
-                    unit_price=item["unit_price"],
-                    total_price=item["total_price"]
-                )
-                for item in invoice["invoice"]["items"]
-            ],
-            summary=SummaryDocument(
-                subtotal=invoice["invoice"]["summary"]["subtotal"],
-                tax_rate=invoice["invoice"]["summary"]["tax_rate"],
-                tax_amount=invoice["invoice"]["summary"]["tax_amount"],
-                total_amount=invoice["invoice"]["summary"]["total_amount"],
-                discount=invoice["invoice"]["summary"]["discount"]
+def build_invoice_document(invoice_json, supplier_id, organization_id, original_invoice_id, parties=None):
+    # Parse the JSON invoice to extract relevant fields
+    invoice = json.loads(invoice_json)
+
+    # Extract and convert dates
+    invoice_date = datetime.strptime(invoice["invoice"]["header"]["invoice_date"], "%Y-%m-%d")
+    due_date = datetime.strptime(invoice["invoice"]["header"]["due_date"], "%Y-%m-%d")
+
+    # Prepare the document
+    return InvoiceDocument(
+        meta={'id': str(original_invoice_id)},
+        invoice_number=invoice["invoice"]["header"]["invoice_number"],
+        invoice_date=invoice_date,
+        due_date=due_date,
+        currency=invoice["invoice"]["header"]["currency"],
+        issuer=supplier_id,
+        recipient=organization_id,
+        seller=CompanyDocument(
+            company_name=invoice["invoice"]["seller"]["company_name"],
+            address=AddressDocument(
+                street=invoice["invoice"]["seller"]["address"]["street"],
+                city=invoice["invoice"]["seller"]["address"]["city"],
+                state=invoice["invoice"]["seller"]["address"]["state"],
+                zip_code=invoice["invoice"]["seller"]["address"]["zip_code"],
+                country=invoice["invoice"]["seller"]["address"]["country"]
             ),
-            payment_instructions=PaymentInstructionsDocument(
-                bank_name=invoice["invoice"]["payment_instructions"]["bank_name"],
-                account_number=invoice["invoice"]["payment_instructions"]["account_number"],
-                routing_number=invoice["invoice"]["payment_instructions"]["routing_number"],
-                swift=invoice["invoice"]["payment_instructions"]["swift"]
+            contact=ContactDocument(
+                name=invoice["invoice"]["seller"]["contact"]["name"],
+                phone=invoice["invoice"]["seller"]["contact"]["phone"],
+                email=invoice["invoice"]["seller"]["contact"]["email"]
+            )
+        ),
+        buyer=CompanyDocument(
+            company_name=invoice["invoice"]["buyer"]["company_name"],
+            address=AddressDocument(
+                street=invoice["invoice"]["buyer"]["address"]["street"],
+                city=invoice["invoice"]["buyer"]["address"]["city"],
+                state=invoice["invoice"]["buyer"]["address"]["state"],
+                zip_code=invoice["invoice"]["buyer"]["address"]["zip_code"],
+                country=invoice["invoice"]["buyer"]["address"]["country"]
             ),
-            notes=NotesDocument(
-                note=invoice["invoice"]["notes"]["note"]
-            ),
-            original_invoice_id=str(original_invoice_id)  
-        )
+            contact=ContactDocument(
+                name=invoice["invoice"]["buyer"]["contact"]["name"],
+                phone=invoice["invoice"]["buyer"]["contact"]["phone"],
+                email=invoice["invoice"]["buyer"]["contact"]["email"]
+            )
+        ),
+        items=[
+            ItemDocument(
+                description=item["description"],
+                quantity=item["quantity"],
+                unit_price=item["unit_price"],
+                total_price=item["total_price"]
+            )
+            for item in invoice["invoice"]["items"]
+        ],
+        summary=SummaryDocument(
+            subtotal=invoice["invoice"]["summary"]["subtotal"],
+            tax_rate=invoice["invoice"]["summary"]["tax_rate"],
+            tax_amount=invoice["invoice"]["summary"]["tax_amount"],
+            total_amount=invoice["invoice"]["summary"]["total_amount"],
+            discount=invoice["invoice"]["summary"]["discount"]
+        ),
+        payment_instructions=PaymentInstructionsDocument(
+            bank_name=invoice["invoice"]["payment_instructions"]["bank_name"],
+            account_number=invoice["invoice"]["payment_instructions"]["account_number"],
+            routing_number=invoice["invoice"]["payment_instructions"]["routing_number"],
+            swift=invoice["invoice"]["payment_instructions"]["swift"]
+        ),
+        notes=NotesDocument(
+            note=invoice["invoice"]["notes"]["note"]
+        ),
+        original_invoice_id=str(original_invoice_id),
+        **(parties or {})
+    )
+
+def index_invoice(invoice_json, supplier_id, organization_id, original_invoice_id):
+    try:
+        doc = build_invoice_document(invoice_json, supplier_id, organization_id, original_invoice_id)
         doc.save()
-        print(f"Invoice {invoice['invoice']['header']['invoice_number']} indexed successfully.")
+        print(f"Invoice {doc.invoice_number} indexed successfully.")
     except Exception as e:
         print(f"Error indexing invoice: {str(e)}")
 
@@ -158,5 +166,50 @@ def async_index_invoices(invoice_jsons, supplier_id, organization_id, original_i
 
 
 
+def bulk_index_invoices(entries):
+    # entries: iterable of (invoice_json, supplier_id, organization_id,
+    # original_invoice_id, parties), parties being the party snapshot fields
+    actions = []
+    for invoice_json, supplier_id, organization_id, original_invoice_id, parties in entries:
+        try:
+            doc = build_invoice_document(invoice_json, str(supplier_id), str(organization_id), original_invoice_id, parties)
+            actions.append(doc.to_dict(include_meta=True))
+        except Exception as e:
+            print(f"Error preparing invoice {original_invoice_id} for indexing: {str(e)}")
+    if not actions:
+        return 0, 0
+    indexed, errors = helpers.bulk(es, actions, raise_on_error=False)
+    if errors:
+        print(f"{len(errors)} invoices failed to index")
+    return indexed, len(errors)
+
+
 def delete_invoice_index(invoice_id):
     es.delete(index='invoices', id=invoice_id)
+
+
+def delete_invoices_index(invoice_ids, batch_size=10000):
+    # delete_by_query on original_invoice_id, which also matches documents
+    # indexed before _id was the invoice id. Ids are sent in batches to stay
+    # under the terms query limit.
+    invoice_ids = [str(invoice_id) for invoice_id in invoice_ids]
+    for start in range(0, len(invoice_ids), batch_size):
+        es.delete_by_query(
+            index='invoices',
+            query={'terms': {'original_invoice_id': invoice_ids[start:start + batch_size]}},
+            conflicts='proceed',
+        )
+
+
+def update_party_snapshots_index(party_field, party_id, values):
+    # Rewrites the party snapshot fields of every document whose issuer or
+    # recipient (party_field) is party_id, in one update_by_query.
+    es.update_by_query(
+        index='invoices',
+        query={'term': {party_field: str(party_id)}},
+        script={
+            'source': 'for (entry in params.values.entrySet()) { ctx._source[entry.getKey()] = entry.getValue(); }',
+            'params': {'values': values},
+        },
+        conflicts='proceed',
+    )
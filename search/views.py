@@ -1,11 +1,12 @@
 from rest_framework.decorators import api_view,permission_classes
 from rest_framework.response import Response
 from rest_framework import status
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
 from elasticsearch_dsl import Q, Search, A
 import json
 from datetime import datetime
 from authentication.permissions import IsOrganization,IsSupplier, IsSystemAdmin
+from synth_invo_analyzer.streaming import stream_format, streaming_json_response
 
 es = Elasticsearch(['http://43.204.122.107:9200'])
 
@@ -72,6 +73,12 @@ def search_invoices(request):
     query_params = request.query_params
     size = query_params.get('size', 1000)  
 
+    format = stream_format(request)
+    if format:
+        # Scrolls through every match instead of one response of `size` hits.
+        hits = helpers.scan(es, index="invoices", query={"query": build_search_query(query_params).to_dict()})
+        return streaming_json_response(hits, format)
+
     search_body = {
         "query": build_search_query(query_params).to_dict(),
         "size": size  
@@ -176,6 +183,16 @@ def execute_search(request):
         size = query_params.get('size', 1000)
 
         search = Search.from_dict(query_params)
+
+        format = stream_format(request)
+        if format:
+            def documents():
+                for hit in search.scan():
+                    document = hit.to_dict()
+                    document['_id'] = hit.meta.id
+                    yield document
+            return streaming_json_response(documents(), format, envelope='results', extra={'total': search.count()})
+
         search = search.extra(size=size)
         
         response = search.execute()
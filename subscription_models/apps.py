@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SubscriptionModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'subscription_models'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from synth_invo_analyzer.versioning import bump_versions
+from subscriptions.models import Subscription
+from subscriptions.entitlements import forget_entitlements
+from .models import SubscriptionModel, SubscriptionModelFeatures
+
+# Version scope of the plan list (subscription models with their features).
+PLANS_SCOPE = 'subscription_models'
+
+
+@receiver([post_save, post_delete], sender=SubscriptionModel)
+@receiver([post_save, post_delete], sender=SubscriptionModelFeatures)
+def plans_changed(sender, instance, **kwargs):
+    # After commit, so a poll cannot pair the new version with old rows.
+    transaction.on_commit(lambda: bump_versions([PLANS_SCOPE]))
+
+
+@receiver([post_save, pre_delete], sender=SubscriptionModel)
+@receiver([post_save, post_delete], sender=SubscriptionModelFeatures)
+def entitlements_changed(sender, instance, **kwargs):
+    # Entitlement snapshots carry the name and feature list of their plan.
+    # model_id is the plan's primary key and the feature's foreign key.
+    organization_ids = list(Subscription.objects.filter(subscription_model_id=instance.model_id).values_list('organization_id', flat=True))
+    transaction.on_commit(lambda: forget_entitlements(organization_ids))
@@ -9,6 +9,8 @@ import stripe
 import os
 from dotenv import load_dotenv
 from authentication.permissions import IsSystemAdmin, IsOrganization, IsSupplier
+from synth_invo_analyzer.versioning import conditional_response
+from .signals import PLANS_SCOPE
 
 load_dotenv()
 
@@ -92,9 +94,11 @@ def archive_product(request):
 @api_view(["GET"])
 def get_subscription_models(request):
     try:
-        models = SubscriptionModel.objects.all()
-        serializer = SubscriptionModelSerializer(models, many=True)
-        return Response(serializer.data, status=200)
+        def build():
+            models = SubscriptionModel.objects.prefetch_related('features')
+            serializer = SubscriptionModelSerializer(models, many=True)
+            return Response(serializer.data, status=200)
+        return conditional_response(request, [PLANS_SCOPE], build)
     except Exception as e:
         return Response({'error': str(e)}, status=404)
     
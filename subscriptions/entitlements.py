@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from synth_invo_analyzer.cache import is_shared_cache
+from .models import Subscription
+
+# One precomputed snapshot per organization of what its subscription
+# entitles it to: {'plan', 'paid_through', 'features'}. Snapshots are
+# written by refresh_entitlement from the Stripe webhook handlers and
+# change_plan; a snapshot missing from the cache is rebuilt on read.
+# Snapshots expire after ENTITLEMENT_CACHE_TTL seconds so a missed refresh
+# cannot outlive that. A process-local cache would only see its own
+# process's refreshes, so without a shared cache every read recomputes.
+
+
+def entitlement_key(organization_id):
+    return f'entitlement:organization:{organization_id}'
+
+
+def compute_entitlement(organization_id):
+    subscription = (
+        Subscription.objects.filter(organization_id=organization_id)
+        .select_related('subscription_model')
+        .order_by('-created_at')
+        .first()
+    )
+    if subscription is None:
+        return {'plan': None, 'paid_through': None, 'features': []}
+    return {
+        'plan': subscription.subscription_model.model_name,
+        'paid_through': subscription.next_billing_date if subscription.is_current_period_paid() else None,
+        'features': list(subscription.subscription_model.features.values_list('feature', flat=True)),
+    }
+
+
+def refresh_entitlement(organization_id):
+    entitlement = compute_entitlement(organization_id)
+    if is_shared_cache():
+        cache.set(entitlement_key(organization_id), entitlement, getattr(settings, 'ENTITLEMENT_CACHE_TTL', 3600))
+    return entitlement
+
+
+def forget_entitlements(organization_ids):
+    cache.delete_many([entitlement_key(organization_id) for organization_id in organization_ids])
+
+
+def get_entitlement(organization_id):
+    if not is_shared_cache():
+        return compute_entitlement(organization_id)
+    entitlement = cache.get(entitlement_key(organization_id))
+    if entitlement is None:
+        entitlement = refresh_entitlement(organization_id)
+    return entitlement
+
+
+def is_paid(entitlement):
+    return entitlement['paid_through'] is not None and entitlement['paid_through'] > timezone.now()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from subscriptions.models import Subscription
+from subscriptions.entitlements import forget_entitlements
+
+
+class Command(BaseCommand):
+    help = 'Fill Subscription.paid_through and last_payment_status from the latest payment of each subscription.'
+
+    def handle(self, *args, **options):
+        updated = paid = 0
+        for subscription in Subscription.objects.iterator():
+            latest_payment = subscription.payments.order_by('-payment_date').first()
+            state = subscription.payment_state(latest_payment)
+            # Overwrites unconditionally, so the command can be re-run.
+            Subscription.objects.filter(pk=subscription.pk).update(**state)
+            updated += 1
+            if state['paid_through'] is not None:
+                paid += 1
+
+        forget_entitlements(Subscription.objects.values_list('organization_id', flat=True).distinct())
+        self.stdout.write(self.style.SUCCESS(f'{updated} subscriptions updated, {paid} with a paid period'))
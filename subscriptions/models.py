@@ -25,15 +25,40 @@ class Subscription(models.Model):
     cancellation_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized from the latest payment by record_payment_state.
+    paid_through = models.DateTimeField(null=True, blank=True)
+    last_payment_status = models.CharField(max_length=20, null=True, blank=True)
+    last_payment_at = models.DateTimeField(null=True, blank=True)
 
     def is_current_period_paid(self):
-        now = timezone.now()
-        if self.next_billing_date and self.next_billing_date > now:
-            latest_payment = self.payments.filter(payment_date__gte=self.start_date, payment_date__lte=self.next_billing_date).last()
-            if latest_payment and latest_payment.status == 'paid':
-                if latest_payment.amount_paid >= self.amount:
-                    return True
-        return False
+        return self.paid_through is not None and self.paid_through > timezone.now()
+
+    def payment_state(self, payment):
+        # A payment inside the current billing period that covers the
+        # subscription amount makes it paid through next_billing_date.
+        paid = (
+            payment is not None and payment.status == 'paid' and payment.amount_paid >= self.amount
+            and self.next_billing_date is not None
+            and self.start_date <= payment.payment_date <= self.next_billing_date
+        )
+        return {
+            'paid_through': self.next_billing_date if paid else None,
+            'last_payment_status': payment.status if payment is not None else None,
+            'last_payment_at': payment.payment_date if payment is not None else None,
+        }
+
+    def record_payment_state(self, payment):
+        # One conditional UPDATE, so webhooks delivered out of order cannot
+        # replace the state of a newer payment with an older one.
+        state = self.payment_state(payment)
+        updated = Subscription.objects.filter(
+            models.Q(last_payment_at__isnull=True) | models.Q(last_payment_at__lte=payment.payment_date),
+            pk=self.pk,
+        ).update(updated_at=timezone.now(), **state)
+        if updated:
+            for name, value in state.items():
+                setattr(self, name, value)
+        return bool(updated)
 
 class Payment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -45,3 +70,8 @@ class Payment(models.Model):
     invoice_id = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subscription', 'payment_date'], name='payment_subscription_date_idx'),
+        ]
@@ -8,9 +8,13 @@ from dotenv import load_dotenv
 from datetime import datetime
 from .models import Subscription, Payment, Organization
 from .serializers import SubscriptionSerializer
+from .entitlements import refresh_entitlement
 from subscription_models.models import SubscriptionModel
 from subscription_models.serializers import SubscriptionModelSerializer
+from subscription_models.signals import PLANS_SCOPE
+from synth_invo_analyzer.versioning import conditional_response
 from django.utils.timezone import make_aware
+from django.db import transaction
 from django.db.models import Count, Sum
 from django.db.models.functions import TruncMonth
 
@@ -112,6 +116,7 @@ def handle_subscription_created(event_json):
         )
         
         subscription_obj.save()
+        refresh_entitlement(organization.id)
         print(f"Subscription created: {subscription_obj}")
     
     except Exception as e:
@@ -134,14 +139,17 @@ def handle_payment_succeeded(event_json):
         else:
             raise KeyError("Could not determine amount_paid from event data")
 
-        payment_obj = Payment.objects.create(
-            subscription=subscription_obj,
-            payment_id=payment_data['id'],
-            payment_date=payment_date,
-            status=payment_data['status'],
-            amount_paid=amount_paid,
-            invoice_id=payment_data.get('invoice', "N/A"),
-        )
+        with transaction.atomic():
+            payment_obj = Payment.objects.create(
+                subscription=subscription_obj,
+                payment_id=payment_data['id'],
+                payment_date=payment_date,
+                status=payment_data['status'],
+                amount_paid=amount_paid,
+                invoice_id=payment_data.get('invoice', "N/A"),
+            )
+            subscription_obj.record_payment_state(payment_obj)
+        refresh_entitlement(subscription_obj.organization_id)
         print(f"Payment succeeded: {payment_obj}")
     
     except Subscription.DoesNotExist:
@@ -163,14 +171,17 @@ def handle_payment_failed(event_json):
 
         amount_paid = payment_data.get('amount_paid', 0) / 100.0  
 
-        payment_obj = Payment.objects.create(
-            subscription=subscription_obj,
-            payment_id=payment_data['id'],
-            payment_date=payment_date,
-            status=payment_data['status'],
-            amount_paid=amount_paid,
-            invoice_id=payment_data.get('invoice', "N/A"),
-        )
+        with transaction.atomic():
+            payment_obj = Payment.objects.create(
+                subscription=subscription_obj,
+                payment_id=payment_data['id'],
+                payment_date=payment_date,
+                status=payment_data['status'],
+                amount_paid=amount_paid,
+                invoice_id=payment_data.get('invoice', "N/A"),
+            )
+            subscription_obj.record_payment_state(payment_obj)
+        refresh_entitlement(subscription_obj.organization_id)
         print(f"Payment failed: {payment_obj}")
     
     except Subscription.DoesNotExist:
@@ -192,9 +203,11 @@ def get_current_subscription(request, user_id):
 
 @api_view(['GET'])
 def get_available_plans(request):
-    plans = SubscriptionModel.objects.all()
-    serializer = SubscriptionModelSerializer(plans, many=True)
-    return Response(serializer.data, status=200)
+    def build():
+        plans = SubscriptionModel.objects.prefetch_related('features')
+        serializer = SubscriptionModelSerializer(plans, many=True)
+        return Response(serializer.data, status=200)
+    return conditional_response(request, [PLANS_SCOPE], build)
 
 
 @api_view(['PUT'])
@@ -234,6 +247,7 @@ def change_plan(request):
         subscription.amount = new_amount
         subscription.subscription_model = subscription_model
         subscription.save()
+        refresh_entitlement(subscription.organization_id)
 
         return Response({"status": "success", "message": "Subscription updated successfully"}, status=200)
     
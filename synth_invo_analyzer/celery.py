@@ -0,0 +1,30 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from celery import Celery
+from django.conf import settings
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'synth_invo_analyzer.settings')
+
+app = Celery('synth_invo_analyzer')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+_local_executor = None
+_local_executor_lock = threading.Lock()
+
+
+def dispatch(task, *args):
+    # Sends the task to the Celery broker when one is configured. Without a
+    # broker the task runs on a small thread pool inside this process, which
+    # keeps development setups free of extra services.
+    global _local_executor
+    if settings.CELERY_BROKER_URL:
+        return task.delay(*args)
+    with _local_executor_lock:
+        if _local_executor is None:
+            _local_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'INGESTION_LOCAL_WORKERS', 2),
+                thread_name_prefix='ingestion',
+            )
+    return _local_executor.submit(task, *args)
@@ -0,0 +1,52 @@
+import json
+import re
+import uuid
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON:
+    # JSON text that dumps() writes into the output unchanged, so stored
+    # documents are not parsed and re-encoded on the way out.
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+_fallback_encoder = JSONEncoder()
+
+
+def dumps(value):
+    # Encodes value to UTF-8 JSON bytes with orjson when it is installed.
+    # RawJSON values are encoded as unique placeholder strings first and
+    # swapped for their text afterwards.
+    token = uuid.uuid4().hex
+    raw = []
+
+    def default(obj):
+        if isinstance(obj, RawJSON):
+            raw.append(obj.text.encode('utf-8') if obj.text is not None else b'null')
+            return f'{token}:{len(raw) - 1}'
+        return _fallback_encoder.default(obj)
+
+    if orjson is not None:
+        encoded = orjson.dumps(value, default=default)
+    else:
+        encoded = json.dumps(value, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if not raw:
+        return encoded
+    return re.sub(f'"{token}:(\\d+)"'.encode('ascii'), lambda match: raw[int(match.group(1))], encoded)
+
+
+def embed(data, fields):
+    # Marks the given string fields of a serialized row as raw JSON.
+    data = dict(data)
+    for field in fields:
+        if data.get(field) is not None:
+            data[field] = RawJSON(data[field])
+    return data
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -165,6 +166,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'authentication.principal.PrincipalAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
 }
@@ -190,6 +192,7 @@ CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
+    'idempotency-key',
     'Access-Control-Allow-Origin',
 ]
 
@@ -202,6 +205,11 @@ EMAIL_USE_SSL = True
 EMAIL_HOST_USER = 'synthinvoanalyzer@gmail.com'
 EMAIL_HOST_PASSWORD = 'ohpb xyoh nqrt ojai '
 
+# Retries of authentication.tasks.send_emails_task; the n-th retry waits
+# EMAIL_RETRY_DELAY * 2**n seconds.
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_DELAY = 2
+
 
 ELASTICSEARCH_DSL = {
     'default': {
@@ -210,4 +218,94 @@ ELASTICSEARCH_DSL = {
 }
 
 
+# Shared cache. Without REDIS_URL each process keeps its own local-memory
+# cache, so invalidations only reach the process that made them.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a resource version (synth_invo_analyzer.versioning) is kept; an
+# expired version only costs clients one full response.
+RESOURCE_VERSION_TTL = 86400
+
+# Seconds supplier/organization names and logos stay cached for serializers.
+PARTY_DIRECTORY_CACHE_TTL = 300
+
+# Per-process cache of resolved bearer tokens (authentication.principal).
+AUTH_PRINCIPAL_CACHE_SIZE = 10000
+AUTH_PRINCIPAL_CACHE_TTL = 60
+
+# Seconds an organization's entitlement snapshot (subscriptions.entitlements)
+# stays cached between refreshes.
+ENTITLEMENT_CACHE_TTL = 3600
+
+# One-time passwords (authentication.otp_store). Codes verify for OTP_TTL
+# seconds; OTP_RETENTION more seconds they answer "OTP has expired".
+# OTP_STORE names the store class; unset, CacheOTPStore is used with a shared
+# cache (REDIS_URL) and DatabaseOTPStore without one.
+OTP_STORE = os.getenv('OTP_STORE')
+OTP_TTL = 60
+OTP_RETENTION = 300
+
+
+# Invoice ingestion
+
+MAPPING_PLAN_CACHE_SIZE = 512
+MAPPING_PLAN_CACHE_TTL = 300
+
+BULK_UPLOAD_CHUNK_SIZE = 500
+BULK_UPLOAD_GROUP_LOOKAHEAD = 64
+# Worker processes used to convert large CSV uploads; 1 disables the pool.
+BULK_UPLOAD_WORKERS = int(os.getenv('BULK_UPLOAD_WORKERS', os.cpu_count() or 1))
+BULK_UPLOAD_PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+BULK_UPLOAD_PARALLEL_CHUNK_BYTES = 4 * 1024 * 1024
+CASSANDRA_WRITE_CONCURRENCY = 50
+
+# Storage encoding for Invoice.source_format / internal_format: 'json' keeps
+# the text columns, 'zlib' stores compressed blobs. Existing rows can be
+# rewritten with `manage.py encode_invoice_formats`.
+INVOICE_FORMAT_ENCODING = os.getenv('INVOICE_FORMAT_ENCODING', 'zlib')
+INVOICE_FORMAT_ZLIB_LEVEL = 6
+
+# Seconds a serialized invoice stays in the detail endpoint cache.
+INVOICE_DETAIL_CACHE_TTL = 300
+
+# Invoice list endpoints return pages of this size unless ?limit= is given.
+INVOICE_LIST_PAGE_SIZE = 50
+INVOICE_LIST_MAX_PAGE_SIZE = 500
+
+# XML uploads at least this large are parsed incrementally, item by item.
+XML_STREAMING_MIN_BYTES = 5 * 1024 * 1024
+
+# Uploads handed to ingestion jobs are kept here until the job finishes.
+# Celery workers on other hosts need this to be shared storage.
+MEDIA_ROOT = BASE_DIR / 'media'
+INGESTION_UPLOAD_DIR = 'ingestion'
+# Raw XML of invoices ingested by streaming, referenced by Invoice.source_file.
+INVOICE_SOURCE_DIR = 'invoice-sources'
+# Per-document entries kept in a job's report; further entries are counted.
+INGESTION_REPORT_MAX_RESULTS = 1000
+
+
+# Background tasks
+# Without a broker URL, tasks run on a thread pool inside the web process.
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', '')
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_SERIALIZER = 'json'
+INGESTION_LOCAL_WORKERS = 2
+
+
 
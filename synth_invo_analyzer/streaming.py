@@ -0,0 +1,48 @@
+from django.http import StreamingHttpResponse
+from .raw_json import dumps
+
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def stream_format(request):
+    # ?stream=json|ndjson, or an Accept: application/x-ndjson header.
+    # None means the view should answer with a regular Response.
+    requested = request.query_params.get('stream')
+    if requested in STREAM_CONTENT_TYPES:
+        return requested
+    if 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return None
+
+
+def _json_chunks(items, envelope, extra):
+    if envelope:
+        yield b'{' + b''.join(dumps(key) + b':' + dumps(value) + b',' for key, value in (extra or {}).items())
+        yield dumps(envelope) + b':['
+    else:
+        yield b'['
+    separator = b''
+    for item in items:
+        yield separator + dumps(item)
+        separator = b','
+    yield b']}' if envelope else b']'
+
+
+def _ndjson_chunks(items):
+    for item in items:
+        yield dumps(item) + b'\n'
+
+
+def streaming_json_response(items, format, envelope=None, extra=None):
+    # Writes items as they are produced, so memory stays flat however many
+    # there are. In json format the array can be wrapped as
+    # {**extra, envelope: [...]}; ndjson writes one item per line.
+    # Errors after the first byte can no longer change the status code.
+    if format == 'ndjson':
+        chunks = _ndjson_chunks(items)
+    else:
+        chunks = _json_chunks(items, envelope, extra)
+    return StreamingHttpResponse(chunks, content_type=STREAM_CONTENT_TYPES[format])
@@ -0,0 +1,72 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from .cache import is_shared_cache
+
+# Per-resource version counters kept in the shared cache. A scope names one
+# tenant's view of a resource (e.g. 'invoices:organization:<id>'); writers
+# call bump_versions for every scope they change, readers derive ETag and
+# Last-Modified from the versions alone. A version is the time of the last
+# bump in nanoseconds, so a counter lost from the cache comes back as a
+# value no earlier response can have carried. Versions expire after
+# RESOURCE_VERSION_TTL seconds for the same reason. A process-local cache
+# would let workers disagree about versions, so without a shared cache
+# responses are always built and carry no validators.
+
+
+def version_key(scope):
+    return f'version:{scope}'
+
+
+def _timeout():
+    return getattr(settings, 'RESOURCE_VERSION_TTL', 86400)
+
+
+def get_versions(scopes):
+    keys = {version_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), _timeout())
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_versions(scopes):
+    scopes = set(scopes)
+    if scopes and is_shared_cache():
+        now = time.time_ns()
+        cache.set_many({version_key(scope): now for scope in scopes}, _timeout())
+
+
+def conditional_response(request, scopes, build):
+    # Answers 304 Not Modified when the client's If-None-Match /
+    # If-Modified-Since still matches the scopes' versions; build() is only
+    # called otherwise, and its 200 response gets ETag and Last-Modified.
+    if not is_shared_cache():
+        return build()
+    versions = get_versions(scopes)
+    fingerprint = '|'.join([request.get_full_path(), request.META.get('HTTP_ACCEPT', '')] + [str(version) for version in versions])
+    etag = '"' + hashlib.sha1(fingerprint.encode('utf-8')).hexdigest() + '"'
+    last_modified = max(versions) // 1_000_000_000
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        not_modified = if_none_match.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    else:
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        not_modified = if_modified_since is not None and last_modified <= if_modified_since
+
+    if not_modified:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response